@@ -0,0 +1,191 @@
+"""Local read-through JSON API over cached ClassCharts data."""
+
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import client
+from scheduler import DEFAULT_INTERVALS
+from store import ORDER_BY, sync_endpoint
+
+MAX_PAGE_SIZE = 1000
+
+
+class QueryAPI:
+    """Local HTTP/JSON API serving ClassCharts data from the sync store.
+
+    GET /pupils lists the account's pupils (through the response cache) and
+    GET /pupils/<id>/<endpoint>?limit=&offset= pages through a pupil's
+    activity, announcements, attendance, detentions, homework or timetable.
+    An endpoint is synced from ClassCharts only when its store rows are older
+    than the endpoint's poll interval (or, with a scheduler keeping the store
+    current, never synced); concurrent requests for the same rows share one
+    sync. Every response carries an ETag and If-None-Match answers 304."""
+
+    def __init__(
+        self,
+        session,
+        store,
+        host="127.0.0.1",
+        port=8080,
+        intervals=None,
+        scheduler=None,
+        days=30,
+        overlap=1,
+        page_size=100,
+    ):
+        self.session = session
+        self.store = store
+        self.intervals = {**DEFAULT_INTERVALS, **(intervals or {})}
+        self.scheduler = scheduler
+        self.days = days
+        self.overlap = overlap
+        self.page_size = page_size
+        self._pupils = (None, [])
+        self._pupils_lock = threading.Lock()
+        self._synced = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _handler(self))
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        """Base URL the API is served at."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        """Serve in the current thread until stop()."""
+        self._server.serve_forever()
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def pupils(self):
+        """Return the account's pupils as dicts, fetched at most hourly by
+        one request at a time."""
+        with self._pupils_lock:
+            fetched, pupils = self._pupils
+            if fetched is None or time.monotonic() - fetched > 3600:
+                pupils = [
+                    student.to_dict() for student in client.get_pupils(self.session)
+                ]
+                self._pupils = (time.monotonic(), pupils)
+            return pupils
+
+    def records(self, student_id, endpoint, limit, offset):
+        """Return (total, rows) of one endpoint, syncing it first if stale."""
+        key = (student_id, endpoint)
+        if not self._fresh(key):
+            with self._lock:
+                lock = self._locks.setdefault(key, threading.Lock())
+            with lock:
+                # another request may have synced it while this one waited
+                if not self._fresh(key):
+                    sync_endpoint(
+                        self.session,
+                        self.store,
+                        student_id,
+                        endpoint,
+                        self.days,
+                        self.overlap,
+                    )
+                    self._synced[key] = time.monotonic()
+        return self.store.page(endpoint, student_id, limit, offset)
+
+    def respond(self, path, query):
+        """Return (status, JSON body) for a GET request."""
+        parts = [part for part in path.split("/") if part]
+        if parts == ["pupils"]:
+            try:
+                return 200, {"data": self.pupils()}
+            except SystemExit as err:
+                return 502, {"error": f"ClassCharts request failed: {err}"}
+        if len(parts) != 3 or parts[0] != "pupils" or parts[2] not in ORDER_BY:
+            return 404, {"error": f"unknown path: {path}"}
+        try:
+            student_id = int(parts[1])
+            limit = min(MAX_PAGE_SIZE, int(query.get("limit", self.page_size)))
+            offset = int(query.get("offset", 0))
+        except ValueError:
+            return 400, {"error": "pupil id, limit and offset must be integers"}
+        if limit < 1 or offset < 0:
+            return 400, {"error": "limit must be positive and offset not negative"}
+        try:
+            if student_id not in [pupil["id"] for pupil in self.pupils()]:
+                return 404, {"error": f"no pupil {student_id} on this account"}
+            total, rows = self.records(student_id, parts[2], limit, offset)
+        except SystemExit as err:
+            return 502, {"error": f"ClassCharts request failed: {err}"}
+        next_page = None
+        if offset + limit < total:
+            next_page = (
+                f"{path}?{urlencode({'limit': limit, 'offset': offset + limit})}"
+            )
+        return 200, {
+            "data": rows,
+            "meta": {
+                "total": total,
+                "limit": limit,
+                "offset": offset,
+                "next": next_page,
+            },
+        }
+
+    def _fresh(self, key):
+        """Whether a pupil's endpoint can be served from the store as is."""
+        if self.scheduler is not None:
+            return self.store.high_water(*key)[0] is not None
+        synced = self._synced.get(key)
+        return synced is not None and time.monotonic() - synced < self.intervals[key[1]]
+
+
+def _etag(payload):
+    """Strong ETag of a response body."""
+    return f'"{hashlib.sha1(payload).hexdigest()}"'
+
+
+def _handler(api):
+    """Build a request handler class bound to a QueryAPI."""
+
+    class Handler(BaseHTTPRequestHandler):
+        """ClassCharts query API request handler."""
+
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):  # pylint: disable=arguments-differ
+            pass
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Answer a GET request, or 304 if the client's copy is current."""
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            status, body = api.respond(url.path, query)
+            payload = json.dumps(body, default=str).encode()
+            etag = _etag(payload)
+            matches = self.headers.get("If-None-Match", "")
+            if status == 200 and (
+                matches.strip() == "*"
+                or etag in [match.strip() for match in matches.split(",")]
+            ):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
@@ -0,0 +1,323 @@
+"""ClassCharts attachment downloads into a content-addressed store."""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import client
+from store import DATA_DIR
+
+# pylint: disable=import-outside-toplevel
+
+CHUNK_SIZE = 256 * 1024
+
+
+class Attachment:
+    """One file attached to a pupil's announcement or homework."""
+
+    __slots__ = ("student_id", "source", "source_id", "filename", "url")
+
+    def __init__(self, **kwargs):
+        self.student_id = kwargs.get("student_id")
+        self.source = kwargs.get("source")
+        self.source_id = kwargs.get("source_id")
+        self.filename = kwargs.get("filename")
+        self.url = kwargs.get("url")
+
+    @classmethod
+    def from_api(cls, student_id, source, source_id, data):
+        """Build an attachment from an announcement or homework attachment
+        dict, or return None if it has no URL."""
+        url = data.get("url") or data.get("validated_file") or data.get("file")
+        if not url:
+            return None
+        filename = data.get("filename") or data.get("file_name") or ""
+        return cls(
+            student_id=student_id,
+            source=source,
+            source_id=source_id,
+            filename=os.path.basename(filename.replace("\\", "/")).strip()
+            or os.path.basename(url.split("?")[0])
+            or "attachment",
+            url=url,
+        )
+
+    @property
+    def name(self):
+        """File name in the pupil's directory."""
+        return f"{self.source}-{self.source_id}-{self.filename}"
+
+    def __str__(self):
+        return f"{self.name} ({self.url})"
+
+
+def list_attachments(session, student_id, days=30):
+    """Return the attachments of a pupil's announcements and of the homework
+    issued in the last `days` days."""
+    found = []
+    for announcement in client.get_announcements(session, student_id):
+        for entry in announcement.attachments or []:
+            found.append(
+                Attachment.from_api(student_id, "announcement", announcement.id, entry)
+            )
+    for homework in client.get_homework(session, student_id, client.since(days)):
+        for entry in homework.validated_attachments or []:
+            found.append(
+                Attachment.from_api(student_id, "homework", homework.id, entry)
+            )
+    return [attachment for attachment in found if attachment is not None]
+
+
+class AttachmentStore:
+    """Content-addressed attachment store.
+    Files are kept once under objects/ by the SHA-256 of their content, so a
+    file shared by several pupils or announcements takes space once; each
+    pupil's directory holds hard links named after the announcement or
+    homework. Downloads in progress live under partial/ until complete, and
+    the URL index lets later runs skip files already stored."""
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(DATA_DIR, "attachments")
+        self._lock = threading.Lock()
+        for directory in ("objects", "partial"):
+            os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+        self._db = sqlite3.connect(
+            os.path.join(self.root, "index.sqlite3"), check_same_thread=False
+        )
+        self._db.execute("""CREATE TABLE IF NOT EXISTS downloads (
+                url TEXT PRIMARY KEY,
+                digest TEXT,
+                size INTEGER,
+                fetched_at REAL
+            )""")
+        self._db.commit()
+
+    def object_path(self, digest):
+        """Path of the stored file with this content hash."""
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def partial_path(self, url):
+        """Path a download of this URL is written to until it completes."""
+        name = hashlib.sha1(url.encode()).hexdigest()
+        return os.path.join(self.root, "partial", f"{name}.part")
+
+    def validator_path(self, url):
+        """Path of the ETag or Last-Modified value a partial download of this
+        URL was started with, sent as If-Range when it is resumed."""
+        return self.partial_path(url)[: -len(".part")] + ".validator"
+
+    def lookup(self, url):
+        """Content hash of a URL already stored, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest FROM downloads WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or not os.path.exists(self.object_path(row[0])):
+            return None
+        return row[0]
+
+    def commit(self, url, partial):
+        """Move a completed download into the object store; return its hash."""
+        digest = _file_digest(partial)
+        if os.path.exists(self.validator_path(url)):
+            os.remove(self.validator_path(url))
+        target = self.object_path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            os.remove(partial)
+        else:
+            os.replace(partial, target)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?)",
+                (url, digest, os.path.getsize(target), time.time()),
+            )
+            self._db.commit()
+        return digest
+
+    def link(self, attachment, digest):
+        """Give a pupil's attachment its name in the pupil's directory."""
+        directory = os.path.join(self.root, str(attachment.student_id))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, attachment.name)
+        source = self.object_path(digest)
+        if os.path.exists(path):
+            if os.path.samefile(path, source):
+                return path
+            os.remove(path)
+        try:
+            os.link(source, path)
+        except OSError:
+            shutil.copyfile(source, path)
+        return path
+
+    def close(self):
+        """Close the index database."""
+        self._db.close()
+
+
+def _file_digest(path):
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Downloader:
+    """Downloads attachments over the session's pooled transport.
+    Each distinct URL is fetched once, on up to `workers` threads; bodies are
+    streamed to disk in chunks, an interrupted download resumes with an HTTP
+    Range request, and failures are retried as the transport's policy allows.
+    ClassCharts credentials are never sent to attachment hosts."""
+
+    def __init__(self, session, store, workers=4, chunk_size=CHUNK_SIZE):
+        self.transport = session.transport
+        self.store = store
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+
+    def download(self, attachments):
+        """Download and link every attachment; return a summary dict with
+        files, downloaded, stored (already present), bytes and failed
+        ([(url, error)] for every file not stored and every attachment not
+        linked)."""
+        urls = list(dict.fromkeys(attachment.url for attachment in attachments))
+        summary = {"files": len(urls), "downloaded": 0, "stored": 0, "bytes": 0}
+        summary["failed"] = []
+        digests = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for url, result in zip(urls, executor.map(self._download, urls)):
+                if isinstance(result, Exception):
+                    summary["failed"].append((url, result))
+                    continue
+                digest, fetched = result
+                digests[url] = digest
+                if fetched is None:
+                    summary["stored"] += 1
+                else:
+                    summary["downloaded"] += 1
+                    summary["bytes"] += fetched
+        for attachment in attachments:
+            if attachment.url in digests:
+                try:
+                    self.store.link(attachment, digests[attachment.url])
+                except OSError as err:
+                    summary["failed"].append((attachment.url, err))
+        return summary
+
+    def _download(self, url):
+        """Fetch one URL into the store; return (digest, bytes fetched, or
+        None if it was already stored), or the exception that stopped it."""
+        import requests
+
+        digest = self.store.lookup(url)
+        if digest is not None:
+            return digest, None
+        partial = self.store.partial_path(url)
+        policy = self.transport.policy
+        fetched = 0
+        attempt = 0
+        with self.transport.instrumentation.span("download") as span:
+            while True:
+                try:
+                    fetched += self._fetch(url, partial)
+                    digest = self.store.commit(url, partial)
+                    break
+                except requests.exceptions.HTTPError as err:
+                    status = err.response.status_code
+                    if not policy.retryable("GET", attempt, status):
+                        span.set(status=status)
+                        return err
+                    time.sleep(policy.delay(attempt, err.response))
+                except (
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout,
+                ) as err:
+                    # whatever reached the disk is resumed on the next attempt
+                    if not policy.retryable("GET", attempt):
+                        return err
+                    time.sleep(policy.backoff(attempt))
+                except requests.exceptions.RequestException as err:
+                    # e.g. an invalid URL or too many redirects: not retried
+                    return err
+                except OSError as err:
+                    return err
+                attempt += 1
+            span.set(bytes=fetched, retries=attempt)
+            return digest, fetched
+
+    def _fetch(self, url, partial):
+        """Stream a URL onto the end of its partial file; return bytes written.
+        A resumed download sends the validator it started with as If-Range, so
+        a file changed since then is sent whole and replaces the partial; a
+        partial that no longer lines up with the file is fetched again whole."""
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        validator_path = self.store.validator_path(url)
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if os.path.exists(validator_path):
+                with open(validator_path, encoding="utf-8") as source:
+                    headers["If-Range"] = source.read()
+        self.transport.policy.limiter.acquire()
+        with self.transport.http.get(
+            url, headers=headers, stream=True, timeout=self.transport.timeout
+        ) as response:
+            start, total = _content_range(response.headers.get("Content-Range"))
+            if offset and response.status_code == 416 and total == offset:
+                # the partial file already holds the whole body
+                return 0
+            if not offset or response.status_code not in (206, 416):
+                response.raise_for_status()
+                # a server ignoring Range, or If-Range, sends the whole body again
+                return self._write(response, partial, validator_path)
+            if response.status_code == 206 and start == offset:
+                return self._write(response, partial, validator_path)
+        # the partial is longer than the file now is, or the server sent a
+        # different range: start again with a full GET
+        os.remove(partial)
+        return self._fetch(url, partial)
+
+    def _write(self, response, partial, validator_path):
+        """Write a 206 body onto the end of the partial file, or any other
+        body over it; return bytes written."""
+        mode = "ab" if response.status_code == 206 else "wb"
+        if mode == "wb":
+            _save_validator(validator_path, response.headers)
+        written = 0
+        with open(partial, mode) as output:
+            for chunk in response.iter_content(self.chunk_size):
+                output.write(chunk)
+                written += len(chunk)
+        return written
+
+
+def _content_range(content_range):
+    """(first byte, complete length) from a Content-Range header (bytes a-b/N
+    or bytes */N); either is None if it is missing or unknown."""
+    byte_range, _, total = (content_range or "").rpartition("/")
+    first = byte_range.removeprefix("bytes ").partition("-")[0].strip()
+    return (
+        int(first) if first.isdigit() else None,
+        int(total) if total.isdigit() else None,
+    )
+
+
+def _save_validator(path, headers):
+    """Keep a response's strong ETag, or else its Last-Modified date, for
+    If-Range; remove any stale one if it has neither."""
+    etag = headers.get("ETag")
+    validator = etag if etag and not etag.startswith("W/") else None
+    validator = validator or headers.get("Last-Modified")
+    if validator:
+        with open(path, "w", encoding="utf-8") as output:
+            output.write(validator)
+    elif os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,167 @@
+"""ClassCharts attendance statistics."""
+
+from array import array
+from collections import deque
+from datetime import date
+
+try:
+    import numpy
+except ImportError:  # numpy is optional; group-bys fall back to pure Python
+    numpy = None
+
+STATUSES = ("yes", "present", "ignore", "no", "absent", "excused", "late")
+# statuses that count as attending; "ignore" sessions are left out entirely
+ATTENDED = ("yes", "present", "late")
+
+
+def _percentage(attended, counted):
+    """Attendance percentage rounded to one decimal place."""
+    return round(100 * attended / counted, 1) if counted else 0.0
+
+
+def _status_counts(group_codes, status_codes, groups, statuses):
+    """Count rows per (group, status) code pair; return one list of status
+    counts per group, vectorised when numpy is there."""
+    if numpy is not None and len(status_codes):
+        pairs = numpy.frombuffer(group_codes, dtype=numpy.uint32).astype(
+            numpy.int64
+        ) * statuses + numpy.frombuffer(status_codes, dtype=numpy.uint8)
+        return (
+            numpy.bincount(pairs, minlength=groups * statuses)
+            .reshape(groups, statuses)
+            .tolist()
+        )
+    totals = [[0] * statuses for _ in range(groups)]
+    for group, status in zip(group_codes, status_codes):
+        totals[group][status] += 1
+    return totals
+
+
+class AttendanceSummary:
+    """ClassCharts attendance statistics class."""
+
+    def __init__(self, **kwargs):
+        self.status_counts = kwargs.get("status_counts")
+        self.session_counts = kwargs.get("session_counts")
+        self.day_counts = kwargs.get("day_counts")
+        self.late_minutes = kwargs.get("late_minutes")
+        self.percentage = kwargs.get("percentage")
+        self.rolling_percentage = kwargs.get("rolling_percentage")
+        self.weeks = kwargs.get("weeks")
+
+    def __str__(self):
+        return f"{self.percentage}% - {len(self.day_counts)} days"
+
+
+class AttendanceColumns:
+    """Columnar attendance records.
+    Every session of every day (for one or more pupils) is a row across the
+    student_id, date, session, status and late_minutes columns; dates, session
+    names and statuses are stored as small integer codes."""
+
+    def __init__(self):
+        self.student_ids = array("q")
+        self.date_codes = array("I")
+        self.session_codes = array("I")
+        self.status_codes = array("B")
+        self.late_minutes = array("I")
+        self.dates = []
+        self.sessions = []
+        self.statuses = list(STATUSES)
+        self._date_lookup = {}
+        self._session_lookup = {}
+        self._status_lookup = {status: code for code, status in enumerate(STATUSES)}
+
+    @classmethod
+    def from_api(cls, data, student_id=0):
+        """Build columns from an /attendance response's data[date][session]."""
+        columns = cls()
+        columns.extend_api(data, student_id)
+        return columns
+
+    def extend_api(self, data, student_id=0):
+        """Append every session of an /attendance response's data (a list,
+        not a dict, when the range has no sessions)."""
+        for attendance_date, sessions in (data or {}).items():
+            date_code = self._code(self._date_lookup, self.dates, attendance_date)
+            for attendance_session, values in sessions.items():
+                self.student_ids.append(student_id)
+                self.date_codes.append(date_code)
+                self.session_codes.append(
+                    self._code(self._session_lookup, self.sessions, attendance_session)
+                )
+                self.status_codes.append(
+                    self._code(self._status_lookup, self.statuses, values.get("status"))
+                )
+                self.late_minutes.append(values.get("late_minutes") or 0)
+
+    def __len__(self):
+        return len(self.status_codes)
+
+    def summary(self, window=5):
+        """Compute every statistic from two group-bys over the columns.
+        rolling_percentage maps each date to the attendance percentage of the
+        trailing `window` school days; weeks maps (ISO year, week) to counts."""
+        attended_codes = [self._status_lookup[status] for status in ATTENDED]
+        ignore_code = self._status_lookup["ignore"]
+        statuses = len(self.statuses)
+        session_totals = _status_counts(
+            self.session_codes, self.status_codes, len(self.sessions), statuses
+        )
+        day_totals = _status_counts(
+            self.date_codes, self.status_codes, len(self.dates), statuses
+        )
+        status_totals = [sum(column) for column in zip(*day_totals)] or [0] * statuses
+        day_attended = [
+            sum(totals[code] for code in attended_codes) for totals in day_totals
+        ]
+        day_counted = [sum(totals) - totals[ignore_code] for totals in day_totals]
+        late_minutes = sum(self.late_minutes)
+        # per-day totals are small; roll them up in date order
+        rolling = {}
+        weeks = {}
+        trailing = deque()
+        trailing_attended = trailing_counted = 0
+        for date_code in sorted(range(len(self.dates)), key=self.dates.__getitem__):
+            attended, counted = day_attended[date_code], day_counted[date_code]
+            trailing.append((attended, counted))
+            trailing_attended += attended
+            trailing_counted += counted
+            if len(trailing) > window:
+                dropped_attended, dropped_counted = trailing.popleft()
+                trailing_attended -= dropped_attended
+                trailing_counted -= dropped_counted
+            attendance_date = self.dates[date_code]
+            rolling[attendance_date] = _percentage(trailing_attended, trailing_counted)
+            year, week, _ = date.fromisoformat(attendance_date[:10]).isocalendar()
+            totals = weeks.setdefault(
+                (year, week), {"attended": 0, "counted": 0, "days": 0}
+            )
+            totals["attended"] += attended
+            totals["counted"] += counted
+            totals["days"] += 1
+        for totals in weeks.values():
+            totals["percentage"] = _percentage(totals["attended"], totals["counted"])
+        return AttendanceSummary(
+            status_counts=dict(zip(self.statuses, status_totals)),
+            session_counts={
+                session: dict(zip(self.statuses, totals))
+                for session, totals in zip(self.sessions, session_totals)
+            },
+            day_counts={
+                attendance_date: dict(zip(self.statuses, totals))
+                for attendance_date, totals in zip(self.dates, day_totals)
+            },
+            late_minutes=late_minutes,
+            percentage=_percentage(sum(day_attended), sum(day_counted)),
+            rolling_percentage=rolling,
+            weeks=weeks,
+        )
+
+    def _code(self, lookup, values, value):
+        """Return the integer code of a value, adding it if new."""
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(values)
+            values.append(value)
+        return code
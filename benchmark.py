@@ -0,0 +1,255 @@
+"""
+Benchmark the ClassCharts client against the local mock server
+
+Runs each command's fetch function against mockserver.MockServer at several
+data sizes and reports requests/sec, request latency percentiles and peak
+Python memory per command.
+
+With --startup it instead measures how long importing main.py takes (with
+python -X importtime) and fails if the median is over the startup budget.
+
+tests/test_benchmark.py times the same COMMANDS with pytest-benchmark when
+it is installed. This script stays standalone for what pytest-benchmark
+does not measure: per-request latency percentiles, peak memory, several
+data sizes in one table and import time in a fresh interpreter.
+
+Usage:
+    python benchmark.py [--sizes small medium large] [--commands activity ...]
+                        [--latency 0.02] [--error_rate 0.0] [--repeat 3]
+    python benchmark.py --startup [--budget_ms 30]
+"""
+
+import argparse
+import atexit
+import contextlib
+import io
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mockserver import MockServer
+
+MOCK = MockServer()
+# Session reads api_url when created and the timed runs inherit the environment
+os.environ["api_url"] = MOCK.url
+# sync, changes and snapshot write their stores and files here, not to the
+# user's data directory; store.py reads data_dir at import time
+SCRATCH = tempfile.mkdtemp(prefix="classcharts-benchmark-")
+atexit.register(shutil.rmtree, SCRATCH, ignore_errors=True)
+os.environ["data_dir"] = SCRATCH
+
+# pylint: disable=wrong-import-position
+import main  # noqa: E402
+from classcharts import Session  # noqa: E402
+import client  # noqa: E402
+
+SIZES = {
+    "small": {"activity_rows": 200, "timetable_days": 5, "homeworks": 10},
+    "medium": {"activity_rows": 2000, "timetable_days": 20, "homeworks": 50},
+    "large": {"activity_rows": 20000, "timetable_days": 60, "homeworks": 200},
+}
+
+COMMANDS = {
+    "academicreport": lambda session: main._get_academicreport(session, 1),
+    "activity": lambda session: main._get_activity(session, 1, days=3650),
+    "announcements": lambda session: main._get_announcements(session, 1),
+    "attendance": lambda session: main._get_attendance(session, 1, days=30),
+    "badges": lambda session: main._get_badges(session, 1),
+    "behaviour": lambda session: main._get_behaviour(session, 1, days=30),
+    # after the first repeat only the comparison with the stored records runs
+    "changes": lambda session: main._changes(
+        session, 1, main.CHANGE_ENDPOINTS, days=30
+    ),
+    "classes": lambda session: main._get_classes(session, 1),
+    "customfields": lambda session: main._get_customfields(session, 1),
+    "detentions": lambda session: main._get_detentions(session, 1),
+    "homework": lambda session: main._get_homework(session, 1, "issue_date", 30),
+    "report": lambda session: main._get_report(session, [("Pupil", 1)], days=365),
+    "snapshot": lambda session: main._snapshot(
+        session,
+        client.get_pupils(session),
+        argparse.Namespace(
+            endpoints=list(main.SNAPSHOT_ENDPOINTS),
+            output_dir=os.path.join(SCRATCH, "snapshots"),
+            format="json",
+            days=30,
+            concurrency=8,
+        ),
+    ),
+    "sync": lambda session: main._sync(session, 1, days=30),
+    "timetable": lambda session: main._get_timetable(session, 1, concurrency=1),
+    "timetable_concurrent": lambda session: main._get_timetable(
+        session, 1, concurrency=8
+    ),
+}
+
+# milliseconds importing main.py may take, dependencies included
+STARTUP_BUDGET_MS = 30
+
+# pylint: disable=protected-access
+
+
+def _percentile(samples, percent):
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _timed_requests(session, samples):
+    """Record the latency of every HTTP request the session sends."""
+    send = session.transport.http.request
+
+    def request(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return send(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+
+    session.transport.http.request = request
+
+
+def run(command, size, repeat=3):
+    """Benchmark one command at one data size; return a result row."""
+    MOCK.configure(**SIZES[size])
+    session = Session(pool_size=16)
+    session.login()
+    samples = []
+    _timed_requests(session, samples)
+    durations = []
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            COMMANDS[command](session)
+        durations.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    session.close()
+    requests_per_run = len(samples) / repeat
+    wall = statistics.median(durations)
+    return [
+        command,
+        size,
+        f"{requests_per_run:g}",
+        f"{wall * 1000:.1f}",
+        f"{requests_per_run / wall:.1f}" if wall else "-",
+        f"{_percentile(samples, 50) * 1000:.1f}",
+        f"{_percentile(samples, 95) * 1000:.1f}",
+        f"{_percentile(samples, 99) * 1000:.1f}",
+        f"{peak / 1024 / 1024:.2f}",
+    ]
+
+
+def _import_times(output):
+    """Parse -X importtime output into (name, depth, self us, cumulative us)."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def startup(budget_ms=STARTUP_BUDGET_MS, runs=7):
+    """Time importing main.py; return (median ms, slowest direct imports, ok)."""
+    env = dict(os.environ)
+    # time the imports as users see them, from cached bytecode
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    directory = os.path.dirname(os.path.abspath(__file__))
+    runs_imports = []
+    for _ in range(runs + 1):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            capture_output=True,
+            text=True,
+            env=env,
+            cwd=directory,
+            check=True,
+        )
+        runs_imports.append(_import_times(result.stderr))
+    # the first run may still be writing bytecode
+    runs_imports = runs_imports[1:]
+    totals = [
+        next(us for name, depth, _, us in imports if name == "main" and depth == 0)
+        for imports in runs_imports
+    ]
+    median_ms = statistics.median(totals) / 1000
+    median_run = runs_imports[totals.index(sorted(totals)[len(totals) // 2])]
+    # children are listed before their parent, so main's direct imports are
+    # the depth 1 entries since the previous top-level import
+    direct = []
+    for name, depth, _, us in median_run:
+        if depth == 0:
+            if name == "main":
+                break
+            direct = []
+        elif depth == 1:
+            direct.append((name, us / 1000))
+    direct.sort(key=lambda item: -item[1])
+    return median_ms, direct[:8], median_ms <= budget_ms
+
+
+def main_benchmark(args=None):
+    """Run the benchmark suite and print a results table."""
+    parser = argparse.ArgumentParser(description="Benchmark the ClassCharts client")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small"])
+    parser.add_argument(
+        "--commands", nargs="+", choices=list(COMMANDS), default=list(COMMANDS)
+    )
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--startup", action="store_true")
+    parser.add_argument("--budget_ms", type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args(args)
+    if args.startup:
+        median_ms, direct, within = startup(args.budget_ms)
+        main._tabulate(
+            [["Import", "Cumulative ms"]]
+            + [[name, f"{ms:.1f}"] for name, ms in direct]
+            + [["main (median)", f"{median_ms:.1f}"]]
+        )
+        print(
+            f"Startup {median_ms:.1f} ms, budget {args.budget_ms:g} ms: "
+            + ("ok" if within else "OVER BUDGET")
+        )
+        sys.exit(0 if within else 1)
+    MOCK.configure(latency=args.latency, error_rate=args.error_rate)
+    MOCK.start()
+    results = [
+        [
+            "Command",
+            "Size",
+            "Requests",
+            "Wall ms",
+            "Req/s",
+            "p50 ms",
+            "p95 ms",
+            "p99 ms",
+            "Peak MiB",
+        ]
+    ]
+    try:
+        for size in args.sizes:
+            for command in args.commands:
+                results.append(run(command, size, args.repeat))
+    finally:
+        MOCK.stop()
+    main._tabulate(results)
+
+
+if __name__ == "__main__":
+    main_benchmark()
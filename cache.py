@@ -0,0 +1,247 @@
+"""ClassCharts on-disk response cache."""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from instrumentation import endpoint as url_endpoint
+
+CACHE_DIR = os.getenv(
+    "cache_dir", os.path.join(os.path.expanduser("~"), ".cache", "classcharts")
+)
+
+# seconds a cached response stays fresh; endpoints not listed are never cached
+DEFAULT_TTLS = {
+    "pupils": 60 * 60,
+    "classes": 24 * 60 * 60,
+    "timetable": 24 * 60 * 60,
+    "announcements": 60 * 60,
+}
+
+
+class CachedResponse:
+    """ClassCharts cached response class."""
+
+    def __init__(self, **kwargs):
+        self.key = kwargs.get("key")
+        self.body = kwargs.get("body")
+        self.etag = kwargs.get("etag")
+        self.last_modified = kwargs.get("last_modified")
+        self.fresh = kwargs.get("fresh")
+
+    def validators(self):
+        """Conditional request headers for revalidating a stale response."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def __str__(self):
+        return f"{self.key} - {'fresh' if self.fresh else 'stale'}"
+
+
+class ResponseCache:
+    """SQLite-backed cache of ClassCharts GET responses.
+    Entries are keyed by account namespace and request URL (endpoint,
+    student_id and query parameters), expire per endpoint TTL and are evicted
+    least-recently-used once the stored bodies exceed max_bytes."""
+
+    def __init__(
+        self,
+        path=None,
+        namespace="",
+        ttls=None,
+        max_bytes=50 * 1024 * 1024,
+        refresh=False,
+    ):
+        self.path = path or os.path.join(CACHE_DIR, "responses.sqlite3")
+        self.namespace = namespace
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT,
+                body TEXT,
+                size INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL,
+                accessed_at REAL
+            )""")
+        self._db.commit()
+
+    def endpoint(self, url):
+        """Endpoint name of an API URL if it has a TTL, e.g. "timetable"."""
+        endpoint = url_endpoint(url)
+        return endpoint if endpoint in self.ttls else None
+
+    def cacheable(self, url):
+        """Whether responses for this URL are cached at all."""
+        endpoint = self.endpoint(url)
+        return endpoint is not None and self.ttls[endpoint] > 0
+
+    def get(self, url):
+        """Return the CachedResponse for a URL, or None on a miss."""
+        if self.refresh or not self.cacheable(url):
+            return None
+        key = self._key(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._db.commit()
+        body, etag, last_modified, stored_at = row
+        return CachedResponse(
+            key=key,
+            body=json.loads(body),
+            etag=etag,
+            last_modified=last_modified,
+            fresh=time.time() - stored_at < self.ttls[self.endpoint(url)],
+        )
+
+    def set(self, url, body, headers=None):
+        """Store a decoded JSON response and evict the least recently used."""
+        if not self.cacheable(url):
+            return
+        headers = headers or {}
+        text = json.dumps(body)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self._key(url),
+                    self.endpoint(url),
+                    text,
+                    len(text),
+                    headers.get("ETag"),
+                    headers.get("Last-Modified"),
+                    now,
+                    now,
+                ),
+            )
+            self._db.execute(
+                """DELETE FROM responses WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (
+                            ORDER BY accessed_at DESC, key
+                        ) AS running FROM responses
+                    ) WHERE running > ?
+                )""",
+                (self.max_bytes,),
+            )
+            self._db.commit()
+
+    def revalidated(self, url):
+        """Mark a stale entry fresh again after a 304 Not Modified."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, self._key(url)),
+            )
+            self._db.commit()
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def close(self):
+        """Close the cache database."""
+        self._db.close()
+
+    def _key(self, url):
+        """Cache key for a URL within this account's namespace."""
+        return f"{self.namespace} {url}"
+
+
+class TextCache:
+    """SQLite-backed cache of text extracted from HTML descriptions.
+    Entries are keyed by the SHA-256 of the markup, so they never go stale
+    and are shared by every account and pupil; the least recently used are
+    evicted once the stored text exceeds max_bytes."""
+
+    def __init__(self, path=None, max_bytes=20 * 1024 * 1024):
+        self.path = path or os.path.join(CACHE_DIR, "texts.sqlite3")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS texts (
+                digest TEXT PRIMARY KEY,
+                text TEXT,
+                size INTEGER,
+                accessed_at REAL
+            )""")
+        self._db.commit()
+
+    def get_many(self, digests):
+        """Return {digest: text} for the digests that are cached."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(digests), 500):
+                batch = digests[start : start + 500]
+                found.update(
+                    self._db.execute(
+                        "SELECT digest, text FROM texts WHERE digest IN "
+                        f"({', '.join('?' * len(batch))})",
+                        batch,
+                    ).fetchall()
+                )
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE texts SET accessed_at = ? WHERE digest = ?",
+                    [(now, digest) for digest in found],
+                )
+                self._db.commit()
+        return found
+
+    def set_many(self, texts):
+        """Store {digest: text} and evict the least recently used."""
+        if not texts:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO texts VALUES (?, ?, ?, ?)",
+                [(digest, text, len(text), now) for digest, text in texts.items()],
+            )
+            self._db.execute(
+                """DELETE FROM texts WHERE digest IN (
+                    SELECT digest FROM (
+                        SELECT digest, SUM(size) OVER (
+                            ORDER BY accessed_at DESC, digest
+                        ) AS running FROM texts
+                    ) WHERE running > ?
+                )""",
+                (self.max_bytes,),
+            )
+            self._db.commit()
+
+    def clear(self):
+        """Remove every cached text."""
+        with self._lock:
+            self._db.execute("DELETE FROM texts")
+            self._db.commit()
+
+    def close(self):
+        """Close the cache database."""
+        self._db.close()
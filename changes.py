@@ -0,0 +1,199 @@
+"""ClassCharts change detection and notification sinks."""
+
+from datetime import date, timedelta
+import hashlib
+import json
+
+import client
+
+# pylint: disable=import-outside-toplevel
+
+ENDPOINTS = ("announcements", "detentions", "homework")
+
+
+def record_hash(record):
+    """Content hash of a record dict, independent of key order."""
+    payload = json.dumps(record, sort_keys=True, default=str).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+class Change:
+    """One inserted, updated or deleted record.
+    record is the current record dict (the last stored one for deletes);
+    digest and date are what the snapshot keeps for it."""
+
+    __slots__ = (
+        "kind",
+        "endpoint",
+        "student_id",
+        "id",
+        "date",
+        "digest",
+        "record",
+        "summary",
+    )
+
+    def __init__(self, **kwargs):
+        self.kind = kwargs.get("kind")
+        self.endpoint = kwargs.get("endpoint")
+        self.student_id = kwargs.get("student_id")
+        self.id = kwargs.get("id")
+        self.date = kwargs.get("date")
+        self.digest = kwargs.get("digest")
+        self.record = kwargs.get("record")
+        self.summary = kwargs.get("summary")
+
+    def to_dict(self):
+        """Return the change as a dict for JSON sinks."""
+        return {
+            "kind": self.kind,
+            "endpoint": self.endpoint,
+            "student_id": self.student_id,
+            "id": self.id,
+            "record": self.record,
+        }
+
+    def __str__(self):
+        return f"{self.kind} {self.endpoint} {self.id} (pupil {self.student_id}): {self.summary}"  # pylint: disable=line-too-long
+
+
+def _fetch(session, student_id, endpoint, from_date):
+    """Return {id: (date, model)} of the records currently on ClassCharts."""
+    if endpoint == "homework":
+        models = client.get_homework(session, student_id, from_date)
+        return {model.id: (model.issue_date, model) for model in models}
+    if endpoint == "detentions":
+        models = client.get_detentions(session, student_id)
+        return {model.id: (model.date, model) for model in models}
+    if endpoint == "announcements":
+        models = client.get_announcements(session, student_id)
+        return {model.id: ((model.timestamp or "")[:10], model) for model in models}
+    raise ValueError(f"unknown change endpoint: {endpoint}")
+
+
+def detect_changes(session, store, student_id, endpoint, days=30):
+    """Compare an endpoint's records with the stored snapshot.
+    Returns the inserts, updates and deletes as Change objects without
+    touching the snapshot; pass them to store.apply_changes once delivered.
+    Homework is fetched by issue date, so only homework issued in the last
+    `days` days can be reported deleted."""
+    from_date = date.today() - timedelta(days=days)
+    current = _fetch(session, student_id, endpoint, from_date)
+    previous = store.snapshot(student_id, endpoint)
+    changes = []
+    for record_id, (day, model) in current.items():
+        record = model.to_dict()
+        digest = record_hash(record)
+        stored = previous.get(record_id)
+        if stored is not None and stored[1] == digest:
+            continue
+        changes.append(
+            Change(
+                kind="insert" if stored is None else "update",
+                endpoint=endpoint,
+                student_id=student_id,
+                id=record_id,
+                date=day,
+                digest=digest,
+                record=record,
+                summary=str(model),
+            )
+        )
+    for record_id, (day, digest) in previous.items():
+        if record_id in current:
+            continue
+        if endpoint == "homework" and (day or "") < str(from_date):
+            continue
+        changes.append(
+            Change(
+                kind="delete",
+                endpoint=endpoint,
+                student_id=student_id,
+                id=record_id,
+                date=day,
+                digest=digest,
+                summary=f"removed ({day})",
+            )
+        )
+    return changes
+
+
+class StdoutSink:
+    """Print one line per change."""
+
+    def emit(self, changes):
+        """Deliver a batch of changes."""
+        for change in changes:
+            print(change)
+
+    def close(self):
+        """Release the sink."""
+
+
+class JsonlSink:
+    """Append one JSON object per change to a file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, changes):
+        """Deliver a batch of changes."""
+        if not changes:
+            return
+        with open(self.path, "a", encoding="utf-8") as output:
+            for change in changes:
+                output.write(json.dumps(change.to_dict(), default=str) + "\n")
+
+    def close(self):
+        """Release the sink."""
+
+
+class WebhookSink:
+    """POST each batch of changes as {"changes": [...]} to a URL."""
+
+    def __init__(self, url, timeout=10):
+        import requests
+
+        self.url = url
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def emit(self, changes):
+        """Deliver a batch of changes; raise SystemExit if the hook fails."""
+        import requests
+
+        if not changes:
+            return
+        try:
+            response = self.http.post(
+                self.url,
+                data=json.dumps(
+                    {"changes": [change.to_dict() for change in changes]}, default=str
+                ),
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as err:
+            raise SystemExit(f"Webhook {self.url} failed: {err}") from err
+
+    def close(self):
+        """Release the sink."""
+        self.http.close()
+
+
+SINKS = {
+    "jsonl": JsonlSink,
+    "stdout": StdoutSink,
+    "webhook": WebhookSink,
+}
+
+
+def open_sink(spec):
+    """Return the sink for "stdout", "jsonl:<path>" or "webhook:<url>"."""
+    name, _, target = spec.partition(":")
+    if name not in SINKS or (name != "stdout") != bool(target):
+        raise SystemExit(
+            f"Unknown sink {spec!r}: use stdout, jsonl:<path> or webhook:<url>"
+        )
+    return SINKS[name](target) if target else SINKS[name]()
@@ -1,145 +1,655 @@
 """ClassCharts helper module."""
 
+from array import array
+from datetime import datetime, timezone
+import json
 import os
-import requests
+import random
+import sys
+import threading
+import time
+from instrumentation import Instrumentation, endpoint
+
+TOKEN_FILE = os.getenv(
+    "token_file",
+    os.path.join(os.path.expanduser("~"), ".cache", "classcharts", "session.json"),
+)
 
 # pylint: disable=too-few-public-methods
 # pylint: disable=too-many-instance-attributes
+# requests, asyncio and friends are imported where used to keep startup fast
+# pylint: disable=import-outside-toplevel
 
 
-class Activity:
-    """ClassCharts activity class."""
+class _Model:
+    """Base class for the slotted ClassCharts models.
+    Subclasses list their fields in __slots__ and copy them out of an API dict
+    in _load; from_api builds a model without copying the dict into kwargs."""
+
+    __slots__ = ()
+    # API keys for fields whose attribute name differs
+    api_keys = {}
 
     def __init__(self, **kwargs):
-        self.id = kwargs.get("id")
-        self.timestamp = kwargs.get("timestamp")
-        self.timestamp_custom_time = kwargs.get("timestamp_custom_time")
-        self.type = kwargs.get("type")
-        self.polarity = kwargs.get("polarity")
-        self.reason = kwargs.get("reason")
-        self.score = kwargs.get("score")
-        self.lesson_name = kwargs.get("lesson_name")
-        self.teacher_name = kwargs.get("teacher_name")
-        self.room_name = kwargs.get("room_name")
-        self.note = kwargs.get("note")
-        self.can_delete = kwargs.get("_can_delete")
-        self.badges = kwargs.get("badges")
+        self._load(kwargs)
+
+    @classmethod
+    def from_api(cls, data):
+        """Build a model straight from an API response dict."""
+        model = cls.__new__(cls)
+        model._load(data)  # pylint: disable=protected-access
+        return model
+
+    def to_dict(self):
+        """Return the model's fields as a dict."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def _load(self, data):
+        """Copy this model's fields out of an API dict."""
+        raise NotImplementedError
+
+
+class _Table:
+    """Base class for the columnar model containers.
+    Each model field is stored as one column: numeric fields in typed arrays
+    (None stored as 0), repetitive strings dictionary-encoded as array codes
+    plus a category list, and anything else in a plain list."""
+
+    model = _Model
+    numeric = {}
+    categorical = ()
+
+    def __init__(self, models=()):
+        self._numeric = {name: array(code) for name, code in self.numeric.items()}
+        self._codes = {name: array("I") for name in self.categorical}
+        self._categories = {name: [] for name in self.categorical}
+        self._lookup = {name: {} for name in self.categorical}
+        self._objects = {
+            name: []
+            for name in self.model.__slots__
+            if name not in self.numeric and name not in self.categorical
+        }
+        self.extend(models)
+
+    @classmethod
+    def from_api(cls, rows):
+        """Build a table straight from API response dicts, column by column."""
+        rows = list(rows)
+        table = cls()
+        for name in cls.model.__slots__:
+            key = cls.model.api_keys.get(name, name)
+            table._add(name, [row.get(key) for row in rows])
+        return table
+
+    def append(self, model):
+        """Add one model as a row."""
+        self.extend((model,))
+
+    def extend(self, models):
+        """Add every model in an iterable as rows."""
+        models = list(models)
+        for name in self.model.__slots__:
+            self._add(name, [getattr(model, name) for model in models])
+
+    def _add(self, name, values):
+        """Append a batch of values to one column."""
+        if name in self._numeric:
+            self._numeric[name].extend(value or 0 for value in values)
+        elif name in self._codes:
+            lookup = self._lookup[name]
+            categories = self._categories[name]
+            for value in values:
+                if value not in lookup:
+                    lookup[value] = len(categories)
+                    categories.append(value)
+            self._codes[name].extend(lookup[value] for value in values)
+        else:
+            self._objects[name].extend(values)
+
+    def column(self, name):
+        """Return one field as a sequence (categories decoded)."""
+        if name in self._numeric:
+            return self._numeric[name]
+        if name in self._codes:
+            categories = self._categories[name]
+            return [categories[code] for code in self._codes[name]]
+        return self._objects[name]
+
+    def codes(self, name):
+        """Return (codes, categories) of a dictionary-encoded field."""
+        return self._codes[name], self._categories[name]
+
+    def __len__(self):
+        return len(next(iter(self._objects.values())))
+
+    def __getitem__(self, index):
+        model = self.model.__new__(self.model)
+        for name in self.model.__slots__:
+            if name in self._numeric:
+                value = self._numeric[name][index]
+            elif name in self._codes:
+                value = self._categories[name][self._codes[name][index]]
+            else:
+                value = self._objects[name][index]
+            setattr(model, name, value)
+        return model
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+
+class Activity(_Model):
+    """ClassCharts activity class."""
+
+    __slots__ = (
+        "id",
+        "timestamp",
+        "timestamp_custom_time",
+        "type",
+        "polarity",
+        "reason",
+        "score",
+        "lesson_name",
+        "teacher_name",
+        "room_name",
+        "note",
+        "can_delete",
+        "badges",
+    )
+    api_keys = {"can_delete": "_can_delete"}
+
+    def _load(self, data):
+        self.id = data.get("id")
+        self.timestamp = data.get("timestamp")
+        self.timestamp_custom_time = data.get("timestamp_custom_time")
+        self.type = data.get("type")
+        self.polarity = data.get("polarity")
+        self.reason = data.get("reason")
+        self.score = data.get("score")
+        self.lesson_name = data.get("lesson_name")
+        self.teacher_name = data.get("teacher_name")
+        self.room_name = data.get("room_name")
+        self.note = data.get("note")
+        self.can_delete = data.get("_can_delete")
+        self.badges = data.get("badges")
 
     def __str__(self):
         return f"{self.timestamp} - {self.type} - {self.reason} - {self.score}"
 
 
-class Announcements:
+class ActivityTable(_Table):
+    """Columnar ClassCharts activity container."""
+
+    model = Activity
+    numeric = {"id": "q", "score": "d"}
+    categorical = (
+        "type",
+        "polarity",
+        "reason",
+        "lesson_name",
+        "teacher_name",
+        "room_name",
+    )
+
+
+class Announcements(_Model):
     """ClassCharts announcements class."""
 
-    def __init__(self, **kwargs):
-        self.id = kwargs.get("id")
-        self.title = kwargs.get("title")
-        self.description = kwargs.get("description")
-        self.school_name = kwargs.get("school_name")
-        self.teacher_name = kwargs.get("teacher_name")
-        self.school_logo = kwargs.get("school_logo")
-        self.sticky = kwargs.get("sticky")
-        self.state = kwargs.get("state")
-        self.timestamp = kwargs.get("timestamp")
-        self.attachments = kwargs.get("attachments")
-        self.for_pupils = kwargs.get("for_pupils")
-        self.comment_visibility = kwargs.get("comment_visibility")
-        self.allow_comments = kwargs.get("allow_comments")
-        self.allow_reactions = kwargs.get("allow_reactions")
-        self.allow_consent = kwargs.get("allow_consent")
-        self.priority_pinned = kwargs.get("priority_pinned")
-        self.requires_consent = kwargs.get("requires_consent")
-        self.can_change_consent = kwargs.get("can_change_consent")
-        self.consent = kwargs.get("consent")
-        self.pupil_consents = kwargs.get("pupil_consents")
+    __slots__ = (
+        "id",
+        "title",
+        "description",
+        "school_name",
+        "teacher_name",
+        "school_logo",
+        "sticky",
+        "state",
+        "timestamp",
+        "attachments",
+        "for_pupils",
+        "comment_visibility",
+        "allow_comments",
+        "allow_reactions",
+        "allow_consent",
+        "priority_pinned",
+        "requires_consent",
+        "can_change_consent",
+        "consent",
+        "pupil_consents",
+    )
+
+    def _load(self, data):
+        self.id = data.get("id")
+        self.title = data.get("title")
+        self.description = data.get("description")
+        self.school_name = data.get("school_name")
+        self.teacher_name = data.get("teacher_name")
+        self.school_logo = data.get("school_logo")
+        self.sticky = data.get("sticky")
+        self.state = data.get("state")
+        self.timestamp = data.get("timestamp")
+        self.attachments = data.get("attachments")
+        self.for_pupils = data.get("for_pupils")
+        self.comment_visibility = data.get("comment_visibility")
+        self.allow_comments = data.get("allow_comments")
+        self.allow_reactions = data.get("allow_reactions")
+        self.allow_consent = data.get("allow_consent")
+        self.priority_pinned = data.get("priority_pinned")
+        self.requires_consent = data.get("requires_consent")
+        self.can_change_consent = data.get("can_change_consent")
+        self.consent = data.get("consent")
+        self.pupil_consents = data.get("pupil_consents")
 
     def __str__(self):
         return f"{self.title} - {self.teacher_name} - {self.timestamp}"
 
 
-class AttendanceData:
+class AsyncSession:
+    """Asyncio ClassCharts session.
+    Wraps a Session and runs its blocking requests on a worker pool sized to
+    the shared connection pool, so many pupils and endpoints can be awaited
+    concurrently from one event loop without stalling it."""
+
+    def __init__(
+        self,
+        pool_size=10,
+        keep_alive=True,
+        cache=None,
+        policy=None,
+        instrumentation=None,
+    ):
+        self.session = Session(
+            pool_size=pool_size,
+            keep_alive=keep_alive,
+            cache=cache,
+            policy=policy,
+            instrumentation=instrumentation,
+        )
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.pool_size = pool_size
+        self._executor = ThreadPoolExecutor(max_workers=pool_size)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    @property
+    def session_id(self):
+        """Current access token of the wrapped session."""
+        return self.session.session_id
+
+    async def login(self):
+        """Login to ClassCharts and get an Access token (session_id)."""
+        return await self._run(self.session.login)
+
+    async def ping(self):
+        """Refresh ClassCharts login session_id."""
+        return await self._run(self.session.ping)
+
+    async def get_pupils(self):
+        """Get all pupils on the account as Student objects."""
+        import client
+
+        return await self._call(client.get_pupils)
+
+    async def get_academicreport(self, student_id):
+        """Get a pupil's academic report data."""
+        import client
+
+        return await self._call(client.get_academicreport, student_id)
+
+    async def get_activity(self, student_id, from_date, to_date):
+        """Get every Activity between two dates, following the last_id cursor."""
+        import client
+
+        return await self._run(
+            lambda: list(
+                client.iter_activity(self.session, student_id, from_date, to_date)
+            )
+        )
+
+    async def get_announcements(self, student_id):
+        """Get a pupil's announcements."""
+        import client
+
+        return await self._call(client.get_announcements, student_id)
+
+    async def get_attendance(self, student_id, from_date, to_date):
+        """Get attendance as (AttendanceMeta, {date: {session: AttendanceData}})."""
+        import client
+
+        attendance = await self._call(
+            client.get_attendance, student_id, from_date, to_date
+        )
+        sessions = {}
+        for attendance_date, name, data in attendance.sessions():
+            sessions.setdefault(attendance_date, {})[name] = data
+        return attendance.meta, sessions
+
+    async def get_badges(self, student_id):
+        """Get a pupil's event badges."""
+        import client
+
+        return await self._call(client.get_badges, student_id)
+
+    async def get_behaviour(self, student_id, from_date, to_date):
+        """Get a pupil's behaviour summary."""
+        import client
+
+        return await self._call(client.get_behaviour, student_id, from_date, to_date)
+
+    async def get_classes(self, student_id):
+        """Get a pupil's classes."""
+        import client
+
+        return await self._call(client.get_classes, student_id)
+
+    async def get_customfields(self, student_id):
+        """Get a pupil's custom fields."""
+        import client
+
+        return await self._call(client.get_customfields, student_id)
+
+    async def get_detentions(self, student_id):
+        """Get a pupil's detentions."""
+        import client
+
+        return await self._call(client.get_detentions, student_id)
+
+    async def get_homeworks(self, student_id, display_date, from_date, to_date):
+        """Get a pupil's homework between two dates."""
+        import client
+
+        return await self._call(
+            client.get_homework, student_id, from_date, to_date, display_date
+        )
+
+    async def get_timetable(self, student_id, date_required):
+        """Get every timetable day around date_required, fetched concurrently.
+        Lessons come back in timetable_dates order with period times filled in."""
+        import client
+
+        return await self._call(
+            client.get_timetable_range, student_id, date_required, self.pool_size
+        )
+
+    def close(self):
+        """Shut down the worker pool and close pooled connections."""
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    async def _call(self, func, *args):
+        """Run a client function on the wrapped session without blocking the
+        event loop; a response with success 0 raises APIError."""
+        return await self._run(func, self.session, *args)
+
+    async def _run(self, func, *args):
+        """Run a blocking call on the worker pool."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+
+class AttendanceData(_Model):
     """ClassCharts attendance class."""
 
-    def __init__(self, **kwargs):
-        self.code = kwargs.get("code")
-        self.status = kwargs.get("status")
-        self.late_minutes = kwargs.get("late_minutes")
+    __slots__ = (
+        "code",
+        "status",
+        "late_minutes",
+    )
+
+    def _load(self, data):
+        self.code = data.get("code")
+        self.status = data.get("status")
+        self.late_minutes = data.get("late_minutes")
 
     def __str__(self):
         return f"{self.code} - {self.status} - {self.late_minutes}"
 
 
-class AttendanceMeta:
+class AttendanceMeta(_Model):
     """ClassCharts attendance class."""
 
-    def __init__(self, **kwargs):
-        self.dates = kwargs.get("dates")
-        self.sessions = kwargs.get("sessions")
-        self.percentage = kwargs.get("percentage")
-        self.percentage_since_august = kwargs.get("percentage_singe_august")
-        self.start_date = kwargs.get("start_date")
-        self.end_date = kwargs.get("end_date")
+    __slots__ = (
+        "dates",
+        "sessions",
+        "percentage",
+        "percentage_since_august",
+        "start_date",
+        "end_date",
+    )
+    api_keys = {"percentage_since_august": "percentage_singe_august"}
+
+    def _load(self, data):
+        self.dates = data.get("dates")
+        self.sessions = data.get("sessions")
+        self.percentage = data.get("percentage")
+        self.percentage_since_august = data.get("percentage_singe_august")
+        self.start_date = data.get("start_date")
+        self.end_date = data.get("end_date")
 
     def __str__(self):
         return f"{self.percentage} - {self.percentage_since_august}"
 
 
-class Detentions:
+class APIError(SystemExit):
+    """ClassCharts answered a request with success 0."""
+
+
+class AuthenticationError(SystemExit):
+    """ClassCharts rejected the session_id (HTTP 401)."""
+
+
+class Detentions(_Model):
     """ClassCharts detentions class."""
 
-    def __init__(self, **kwargs):
-        self.id = kwargs.get("id")
-        self.attended = kwargs.get("attended")
-        self.date = kwargs.get("date")
-        self.length = kwargs.get("length")
-        self.location = kwargs.get("location")
-        self.notes = kwargs.get("notes")
-        self.time = kwargs.get("time")
-        self.pupil = kwargs.get("pupil")
-        self.lesson = kwargs.get("lesson")
-        self.lesson_pupil_behaviour = kwargs.get("lesson_pupil_behaviour")
-        self.teacher = kwargs.get("teacher")
-        self.detention_type = kwargs.get("detention_type")
+    __slots__ = (
+        "id",
+        "attended",
+        "date",
+        "length",
+        "location",
+        "notes",
+        "time",
+        "pupil",
+        "lesson",
+        "lesson_pupil_behaviour",
+        "teacher",
+        "detention_type",
+    )
+
+    def _load(self, data):
+        self.id = data.get("id")
+        self.attended = data.get("attended")
+        self.date = data.get("date")
+        self.length = data.get("length")
+        self.location = data.get("location")
+        self.notes = data.get("notes")
+        self.time = data.get("time")
+        self.pupil = data.get("pupil")
+        self.lesson = data.get("lesson")
+        self.lesson_pupil_behaviour = data.get("lesson_pupil_behaviour")
+        self.teacher = data.get("teacher")
+        self.detention_type = data.get("detention_type")
 
     def __str__(self):
         return f"{self.date} - {self.time} - {self.location} - {self.notes}"
 
 
-class Homework:
+class Homework(_Model):
     """ClassCharts homework class."""
 
-    def __init__(self, **kwargs):
-        self.lesson = kwargs.get("lesson")
-        self.subject = kwargs.get("subject")
-        self.teacher = kwargs.get("teacher")
-        self.homework_type = kwargs.get("homework_type")
-        self.id = kwargs.get("id")
-        self.title = kwargs.get("title")
-        self.meta_title = kwargs.get("meta_title")
-        self.description = kwargs.get("description")
-        self.issue_date = kwargs.get("issue_date")
-        self.due_date = kwargs.get("due_date")
-        self.completion_time_unit = kwargs.get("completion_time_unit")
-        self.completion_time_value = kwargs.get("completion_time_value")
-        self.publish_time = kwargs.get("publish_time")
-        self.status = kwargs.get("status")
-        self.validated_links = kwargs.get("validated_links")
-        self.validated_attachments = kwargs.get("validated_attachments")
+    __slots__ = (
+        "lesson",
+        "subject",
+        "teacher",
+        "homework_type",
+        "id",
+        "title",
+        "meta_title",
+        "description",
+        "issue_date",
+        "due_date",
+        "completion_time_unit",
+        "completion_time_value",
+        "publish_time",
+        "status",
+        "validated_links",
+        "validated_attachments",
+    )
+
+    def _load(self, data):
+        self.lesson = data.get("lesson")
+        self.subject = data.get("subject")
+        self.teacher = data.get("teacher")
+        self.homework_type = data.get("homework_type")
+        self.id = data.get("id")
+        self.title = data.get("title")
+        self.meta_title = data.get("meta_title")
+        self.description = data.get("description")
+        self.issue_date = data.get("issue_date")
+        self.due_date = data.get("due_date")
+        self.completion_time_unit = data.get("completion_time_unit")
+        self.completion_time_value = data.get("completion_time_value")
+        self.publish_time = data.get("publish_time")
+        self.status = data.get("status")
+        self.validated_links = data.get("validated_links")
+        self.validated_attachments = data.get("validated_attachments")
 
     def __str__(self):
         return f"{self.title} ({self.subject}) - {self.due_date}"
 
 
+class HomeworkTable(_Table):
+    """Columnar ClassCharts homework container."""
+
+    model = Homework
+    numeric = {"id": "q"}
+    categorical = (
+        "lesson",
+        "subject",
+        "teacher",
+        "homework_type",
+        "completion_time_unit",
+    )
+
+
+class RateLimiter:
+    """Token-bucket rate limiter shared by every thread and async task.
+    rate is requests per second (None for unlimited); burst is the bucket size."""
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RequestPolicy:
+    """ClassCharts request retry and rate policy.
+    Idempotent methods are retried on connection errors and retryable statuses
+    with exponential backoff and full jitter; 429 and 503 are retried for any
+    method, honouring Retry-After. Every request passes the shared limiter."""
+
+    def __init__(
+        self,
+        retries=3,
+        backoff_factor=0.5,
+        max_backoff=30,
+        rate=None,
+        burst=1,
+        methods=("GET", "HEAD"),
+        statuses=(429, 500, 502, 503, 504),
+    ):
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.methods = methods
+        self.statuses = statuses
+        self.limiter = RateLimiter(rate=rate, burst=burst)
+
+    def retryable(self, method, attempt, status_code=None):
+        """Whether a failed attempt should be retried."""
+        if attempt >= self.retries:
+            return False
+        if status_code is None:
+            return method in self.methods
+        if status_code in (429, 503):
+            return True
+        return status_code in self.statuses and method in self.methods
+
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter for the given attempt."""
+        ceiling = min(self.max_backoff, self.backoff_factor * 2**attempt)
+        return random.uniform(0, ceiling)
+
+    def delay(self, attempt, response):
+        """Seconds to wait before retrying a response, using Retry-After if set."""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                seconds = float(retry_after)
+            except ValueError:
+                from email.utils import parsedate_to_datetime
+
+                try:
+                    retry_at = parsedate_to_datetime(retry_after)
+                except (TypeError, ValueError):
+                    return self.backoff(attempt)
+                seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+            return min(self.max_backoff, max(0, seconds))
+        return self.backoff(attempt)
+
+
 class Session:
     """ClassCharts session class."""
 
-    def __init__(self):
+    def __init__(
+        self,
+        pool_size=10,
+        keep_alive=True,
+        cache=None,
+        token_file=None,
+        policy=None,
+        instrumentation=None,
+    ):
         self.api_url = os.getenv("api_url", "")
         self.username = os.getenv("email", "")
         self.password = os.getenv("password", "")
         self.session_id = None
         self.success = 0
+        self.tokens = TokenManager(self, path=token_file)
+        self.transport = Transport(
+            pool_size=pool_size,
+            keep_alive=keep_alive,
+            cache=cache,
+            policy=policy,
+            instrumentation=instrumentation,
+        )
+        self.instrumentation = self.transport.instrumentation
 
     def login(self):
         """Login to ClassCharts and get an Access token (session_id)."""
@@ -149,6 +659,7 @@ class Session:
         response = self._make_request(url, "POST", header, data)
         self.session_id = response["meta"]["session_id"]
         self.success = response["success"]
+        self.tokens.issued()
         return response
 
     def ping(self):
@@ -162,106 +673,473 @@ class Session:
         data = {"include_data": True}
         response = self._make_request(url, "POST", header, data)
         self.session_id = response["meta"]["session_id"]
+        self.tokens.issued()
+        return response
+
+    def resume(self):
+        """Reuse the session_id saved by a previous run if it is still fresh.
+        One ping validates and refreshes it; returns the ping response, or None
+        when a full login is needed."""
+        session_id = self.tokens.load()
+        if session_id is None:
+            return None
+        self.session_id = session_id
+        try:
+            response = self.ping()
+        except SystemExit:
+            response = None
+        if not response or response["success"] != 1:
+            self.session_id = None
+            return None
+        self.success = response["success"]
         return response
 
+    def request(self, method, url, header, data=None):
+        """Make an authenticated request, refreshing the session_id first if it
+        is about to expire and logging in again once if it is rejected."""
+        self.tokens.ensure_fresh()
+        session_id = self.session_id
+        try:
+            return self.transport.request(method, url, self._authorize(header), data)
+        except AuthenticationError:
+            self.tokens.relogin(session_id)
+            return self.transport.request(method, url, self._authorize(header), data)
+
+    def get(self, path):
+        """GET an authenticated API path (e.g. "pupils") and return the JSON."""
+        url = f"{self.api_url}/{path}"
+        header = {
+            "Content-Type": "application/json",
+            "Authorization": f"Basic {self.session_id}",
+        }
+        return self.request("GET", url, header)
+
+    def iter_activity(self, student_id, from_date, to_date):
+        """Yield every Activity between two dates, one page at a time.
+        Follows the last_id cursor until the API returns an empty page; a page
+        with success 0 raises APIError."""
+        path = f"activity/{student_id}/?from={from_date}&to={to_date}"
+        response = self.get(path)
+        while True:
+            if response.get("success") != 1:
+                raise APIError(response.get("error") or "ClassCharts request failed")
+            if not response["data"]:
+                return
+            for entry in response["data"]:
+                activity = Activity.from_api(entry)
+                yield activity
+            response = self.get(f"{path}&last_id={activity.id}")
+
+    def close(self):
+        """Stop background token refresh and close pooled connections."""
+        self.tokens.stop()
+        self.transport.close()
+
+    def _authorize(self, header):
+        """Point an Authorization header at the current session_id."""
+        if "Authorization" not in header:
+            return header
+        return {**header, "Authorization": f"Basic {self.session_id}"}
+
     def _make_request(self, url, method, header, data=None):
         """Make a request to ClassCharts API."""
-        try:
-            response = requests.request(
-                method, url, headers=header, data=data, timeout=10
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as err:
-            raise SystemExit(err) from err
+        return self.transport.request(method, url, header, data)
 
 
-class Student:
+class Student(_Model):
     """ClassCharts student class."""
 
+    __slots__ = (
+        "id",
+        "first_name",
+        "last_name",
+        "avatar_url",
+        "has_birthday",
+        "is_disabled",
+        "school_name",
+        "school_logo",
+        "timezone",
+        "display_homework",
+        "display_rewards",
+        "display_behaviour",
+        "display_parent_behaviour",
+        "display_detentions",
+        "display_report_cards",
+        "display_classes",
+        "display_attendance",
+        "display_attendance_type",
+        "display_attendance_percentage",
+        "display_announcements",
+        "display_academic_reports",
+        "display_activity",
+        "display_activity_detentions",
+        "display_timetable",
+        "display_mental_health",
+        "display_two_way_communications",
+        "display_absences",
+        "display_mental_health_no_tracker",
+        "can_upload_attachments",
+        "display_event_badges",
+        "display_avatars",
+        "display_concern_submission",
+        "display_custom_fields",
+        "display_covid_tests",
+        "can_record_covid_tests",
+        "detention_yes_count",
+        "detention_no_count",
+        "detention_pending_count",
+        "detention_upscaled_count",
+        "homework_todo_count",
+        "homework_late_count",
+        "homework_not_completed_count",
+        "homework_excused_count",
+        "homework_completed_count",
+        "homework_submitted_count",
+        "announcements_count",
+        "messages_count",
+        "pusher_channel_name",
+        "name",
+        "detention_alias_plural_uc",
+    )
+
     # pylint: disable=too-many-statements
 
-    def __init__(self, **kwargs):
-        self.id = kwargs.get("id")
-        self.first_name = kwargs.get("first_name")
-        self.last_name = kwargs.get("last_name")
-        self.avatar_url = kwargs.get("avatar_url")
-        self.has_birthday = kwargs.get("has_birthday")
-        self.is_disabled = kwargs.get("is_disabled")
-        self.school_name = kwargs.get("school_name")
-        self.school_logo = kwargs.get("school_logo")
-        self.timezone = kwargs.get("timezone")
-        self.display_homework = kwargs.get("display_homework")
-        self.display_rewards = kwargs.get("display_rewards")
-        self.display_behaviour = kwargs.get("display_behaviour")
-        self.display_parent_behaviour = kwargs.get("display_parent_behaviour")
-        self.display_detentions = kwargs.get("display_detentions")
-        self.display_report_cards = kwargs.get("display_report_cards")
-        self.display_classes = kwargs.get("display_classes")
-        self.display_attendance = kwargs.get("display_attendance")
-        self.display_attendance_type = kwargs.get("display_attendance_type")
-        self.display_attendance_percentage = kwargs.get("display_attendance_percentage")
-        self.display_announcements = kwargs.get("display_announcements")
-        self.display_academic_reports = kwargs.get("display_academic_reports")
-        self.display_activity = kwargs.get("display_activity")
-        self.display_activity_detentions = kwargs.get("display_activity_detentions")
-        self.display_timetable = kwargs.get("display_timetable")
-        self.display_mental_health = kwargs.get("display_mental_health")
-        self.display_two_way_communications = kwargs.get(
-            "display_two_way_communications"
-        )
-        self.display_absences = kwargs.get("display_absences")
-        self.display_mental_health_no_tracker = kwargs.get(
+    def _load(self, data):
+        self.id = data.get("id")
+        self.first_name = data.get("first_name")
+        self.last_name = data.get("last_name")
+        self.avatar_url = data.get("avatar_url")
+        self.has_birthday = data.get("has_birthday")
+        self.is_disabled = data.get("is_disabled")
+        self.school_name = data.get("school_name")
+        self.school_logo = data.get("school_logo")
+        self.timezone = data.get("timezone")
+        self.display_homework = data.get("display_homework")
+        self.display_rewards = data.get("display_rewards")
+        self.display_behaviour = data.get("display_behaviour")
+        self.display_parent_behaviour = data.get("display_parent_behaviour")
+        self.display_detentions = data.get("display_detentions")
+        self.display_report_cards = data.get("display_report_cards")
+        self.display_classes = data.get("display_classes")
+        self.display_attendance = data.get("display_attendance")
+        self.display_attendance_type = data.get("display_attendance_type")
+        self.display_attendance_percentage = data.get("display_attendance_percentage")
+        self.display_announcements = data.get("display_announcements")
+        self.display_academic_reports = data.get("display_academic_reports")
+        self.display_activity = data.get("display_activity")
+        self.display_activity_detentions = data.get("display_activity_detentions")
+        self.display_timetable = data.get("display_timetable")
+        self.display_mental_health = data.get("display_mental_health")
+        self.display_two_way_communications = data.get("display_two_way_communications")
+        self.display_absences = data.get("display_absences")
+        self.display_mental_health_no_tracker = data.get(
             "display_mental_health_no_tracker"
         )
-        self.can_upload_attachments = kwargs.get("can_upload_attachments")
-        self.display_event_badges = kwargs.get("display_event_badges")
-        self.display_avatars = kwargs.get("display_avatars")
-        self.display_concern_submission = kwargs.get("display_concern_submission")
-        self.display_custom_fields = kwargs.get("display_custom_fields")
-        self.display_covid_tests = kwargs.get("display_covid_tests")
-        self.can_record_covid_tests = kwargs.get("can_record_covid_tests")
-        self.detention_yes_count = kwargs.get("detention_yes_count")
-        self.detention_no_count = kwargs.get("detention_no_count")
-        self.detention_pending_count = kwargs.get("detention_pending_count")
-        self.detention_upscaled_count = kwargs.get("detention_upscaled_count")
-        self.homework_todo_count = kwargs.get("homework_todo_count")
-        self.homework_late_count = kwargs.get("homework_late_count")
-        self.homework_not_completed_count = kwargs.get("homework_not_completed_count")
-        self.homework_excused_count = kwargs.get("homework_excused_count")
-        self.homework_completed_count = kwargs.get("homework_completed_count")
-        self.homework_submitted_count = kwargs.get("homework_submitted_count")
-        self.announcements_count = kwargs.get("announcements_count")
-        self.messages_count = kwargs.get("messages_count")
-        self.pusher_channel_name = kwargs.get("pusher_channel_name")
-        self.name = kwargs.get("name")
-        self.detention_alias_plural_uc = kwargs.get("detention_alias_plural_uc")
+        self.can_upload_attachments = data.get("can_upload_attachments")
+        self.display_event_badges = data.get("display_event_badges")
+        self.display_avatars = data.get("display_avatars")
+        self.display_concern_submission = data.get("display_concern_submission")
+        self.display_custom_fields = data.get("display_custom_fields")
+        self.display_covid_tests = data.get("display_covid_tests")
+        self.can_record_covid_tests = data.get("can_record_covid_tests")
+        self.detention_yes_count = data.get("detention_yes_count")
+        self.detention_no_count = data.get("detention_no_count")
+        self.detention_pending_count = data.get("detention_pending_count")
+        self.detention_upscaled_count = data.get("detention_upscaled_count")
+        self.homework_todo_count = data.get("homework_todo_count")
+        self.homework_late_count = data.get("homework_late_count")
+        self.homework_not_completed_count = data.get("homework_not_completed_count")
+        self.homework_excused_count = data.get("homework_excused_count")
+        self.homework_completed_count = data.get("homework_completed_count")
+        self.homework_submitted_count = data.get("homework_submitted_count")
+        self.announcements_count = data.get("announcements_count")
+        self.messages_count = data.get("messages_count")
+        self.pusher_channel_name = data.get("pusher_channel_name")
+        self.name = data.get("name")
+        self.detention_alias_plural_uc = data.get("detention_alias_plural_uc")
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
 
-class Timetable:
+class Timetable(_Model):
     """ClassCharts timetable class."""
 
-    def __init__(self, **kwargs):
-        self.teacher_name = kwargs.get("teacher_name")
-        self.lesson_id = kwargs.get("lesson_id")
-        self.lesson_name = kwargs.get("lesson_name")
-        self.subject_name = kwargs.get("subject_name")
-        self.is_alternative_lesson = kwargs.get("is_alternative_lesson")
-        self.period_name = kwargs.get("period_name")
-        self.period_number = kwargs.get("period_number")
-        self.room_name = kwargs.get("room_name")
-        self.date = kwargs.get("date")
-        self.start_time = kwargs.get("start_time")
-        self.end_time = kwargs.get("end_time")
-        self.key = kwargs.get("key")
-        self.note_abstract = kwargs.get("note_abstract")
-        self.note = kwargs.get("note")
-        self.pupil_note_abstract = kwargs.get("pupil_note_abstract")
-        self.pupil_note = kwargs.get("pupil_note")
-        self.pupil_note_raw = kwargs.get("pupil_note_raw")
+    __slots__ = (
+        "teacher_name",
+        "lesson_id",
+        "lesson_name",
+        "subject_name",
+        "is_alternative_lesson",
+        "period_name",
+        "period_number",
+        "room_name",
+        "date",
+        "start_time",
+        "end_time",
+        "key",
+        "note_abstract",
+        "note",
+        "pupil_note_abstract",
+        "pupil_note",
+        "pupil_note_raw",
+    )
+
+    def _load(self, data):
+        self.teacher_name = data.get("teacher_name")
+        self.lesson_id = data.get("lesson_id")
+        self.lesson_name = data.get("lesson_name")
+        self.subject_name = data.get("subject_name")
+        self.is_alternative_lesson = data.get("is_alternative_lesson")
+        self.period_name = data.get("period_name")
+        self.period_number = data.get("period_number")
+        self.room_name = data.get("room_name")
+        self.date = data.get("date")
+        self.start_time = data.get("start_time")
+        self.end_time = data.get("end_time")
+        self.key = data.get("key")
+        self.note_abstract = data.get("note_abstract")
+        self.note = data.get("note")
+        self.pupil_note_abstract = data.get("pupil_note_abstract")
+        self.pupil_note = data.get("pupil_note")
+        self.pupil_note_raw = data.get("pupil_note_raw")
 
     def __str__(self):
         return f"{self.lesson_name} - {self.teacher_name} - {self.start_time} - {self.end_time} - {self.room_name}"  # pylint: disable=line-too-long
+
+
+class TokenManager:
+    """ClassCharts session_id lifecycle.
+    Tracks when the shared session_id was issued and refreshes it with ping
+    before it expires, either on demand or from a background thread. Refreshes
+    and re-logins are serialised so concurrent workers share one token. With a
+    path, each new session_id is saved there (mode 0600) for the next run."""
+
+    def __init__(self, session, lifetime=180, margin=30, path=None):
+        self.session = session
+        self.lifetime = lifetime
+        self.margin = margin
+        self.path = path
+        self.issued_at = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def issued(self):
+        """Record that a new session_id was just issued."""
+        self.issued_at = time.monotonic()
+        self.save()
+
+    def load(self):
+        """Return the saved session_id for this account if it has not expired."""
+        if self.path is None or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as token_file:
+                saved = json.load(token_file)
+        except (OSError, ValueError):
+            return None
+        if saved.get("email") != self.session.username:
+            return None
+        age = time.time() - saved.get("issued_at", 0)
+        if not 0 <= age < self.lifetime - self.margin:
+            return None
+        self.issued_at = time.monotonic() - age
+        return saved.get("session_id")
+
+    def save(self):
+        """Write the session_id and its issue time to the token file.
+        Each write goes to its own temporary file, created mode 0600, and
+        replaces the token file in one step, so processes sharing the file
+        never see or install a half-written one."""
+        if self.path is None:
+            return
+        import tempfile
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        saved = {
+            "email": self.session.username,
+            "session_id": self.session.session_id,
+            "issued_at": time.time(),
+        }
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=directory, prefix=".session-", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as token_file:
+                json.dump(saved, token_file)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def expiring(self):
+        """Whether the session_id is within margin seconds of expiring."""
+        if self.issued_at is None:
+            return False
+        return time.monotonic() - self.issued_at >= self.lifetime - self.margin
+
+    def ensure_fresh(self):
+        """Refresh the session_id if it is about to expire."""
+        if self.expiring():
+            with self._lock:
+                if self.expiring():
+                    self.refresh()
+
+    def refresh(self):
+        """Refresh the session_id with ping, logging in again if it has expired."""
+        with self._lock:
+            try:
+                self.session.ping()
+            except AuthenticationError:
+                self.session.login()
+
+    def relogin(self, rejected_session_id):
+        """Log in again after a 401, unless another worker already has."""
+        with self._lock:
+            if self.session.session_id == rejected_session_id:
+                self.session.login()
+
+    def start(self):
+        """Refresh the session_id in a background thread until stop()."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background refresh thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _next_wait(self):
+        """Seconds until the session_id is margin seconds from expiring, at
+        least 1; a login or ping in the meantime moves the deadline."""
+        if self.issued_at is None:
+            return max(1, self.lifetime - self.margin)
+        age = time.monotonic() - self.issued_at
+        return max(1, self.lifetime - self.margin - age)
+
+    def _run(self):
+        """Background loop pinging shortly before each expiry."""
+        while not self._stop.wait(self._next_wait()):
+            try:
+                self.ensure_fresh()
+            except (SystemExit, OSError) as err:
+                # keep refreshing; the next request re-logs in on 401
+                print(f"Background session refresh failed: {err}", file=sys.stderr)
+
+
+class Transport:
+    """Pooled, keep-alive HTTP transport shared by every ClassCharts request.
+    pool_size bounds the connections kept open per host; with keep_alive
+    disabled every request asks the server to close its connection."""
+
+    def __init__(
+        self,
+        pool_size=10,
+        keep_alive=True,
+        timeout=10,
+        cache=None,
+        policy=None,
+        instrumentation=None,
+    ):
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.cache = cache
+        self.policy = policy or RequestPolicy()
+        self.instrumentation = instrumentation or Instrumentation()
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        if not keep_alive:
+            self.http.headers["Connection"] = "close"
+
+    def request(self, method, url, header, data=None):
+        """Make a request to ClassCharts API and return the decoded JSON.
+        Cacheable GETs are answered from the response cache while fresh and
+        revalidated with If-None-Match/If-Modified-Since once stale."""
+        with self.instrumentation.span(
+            "http.request", method=method, endpoint=endpoint(url)
+        ) as span:
+            if self.cache is None or method != "GET":
+                return self._decode(self._send(method, url, header, data))
+            if not self.cache.cacheable(url):
+                span.set(cache="bypass")
+                return self._decode(self._send(method, url, header, data))
+            cached = self.cache.get(url)
+            if cached and cached.fresh:
+                span.set(cache="hit")
+                return cached.body
+            if cached:
+                header = {**header, **cached.validators()}
+            response = self._send(method, url, header, data)
+            if cached and response.status_code == 304:
+                span.set(cache="revalidated")
+                self.cache.revalidated(url)
+                return cached.body
+            span.set(cache="miss")
+            body = self._decode(response)
+            if body.get("success") == 1:
+                self.cache.set(url, body, response.headers)
+            return body
+
+    def _decode(self, response):
+        """Decode a JSON response body; raise APIError if it is not JSON."""
+        with self.instrumentation.span("json.decode"):
+            try:
+                return response.json()
+            except ValueError as err:
+                raise APIError(f"ClassCharts sent an invalid response: {err}") from err
+
+    def _send(self, method, url, header, data=None):
+        """Send a request over the pool, retrying as the policy allows, and
+        raise SystemExit on HTTP errors and APIError once connection errors
+        and timeouts are out of retries."""
+        import requests
+
+        attempt = 0
+        while True:
+            self.policy.limiter.acquire()
+            try:
+                response = self.http.request(
+                    method, url, headers=header, data=data, timeout=self.timeout
+                )
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as err:
+                if not self.policy.retryable(method, attempt):
+                    raise APIError(f"ClassCharts unreachable: {err}") from err
+                time.sleep(self.policy.backoff(attempt))
+            else:
+                if not self.policy.retryable(method, attempt, response.status_code):
+                    break
+                time.sleep(self.policy.delay(attempt, response))
+            attempt += 1
+        self.instrumentation.annotate(
+            status=response.status_code,
+            bytes=len(response.content),
+            retries=attempt,
+        )
+        try:
+            response.raise_for_status()
+            return response
+        except requests.exceptions.HTTPError as err:
+            if err.response is not None and err.response.status_code == 401:
+                raise AuthenticationError(err) from err
+            raise SystemExit(err) from err
+
+    def close(self):
+        """Close all pooled connections and the response cache."""
+        self.http.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,195 @@
+"""Data-returning ClassCharts client functions.
+
+Each function fetches through a classcharts.Session and returns models (or
+an iterator of them) without printing anything, so results can be reused,
+cached, combined and fetched concurrently; main.py only renders them. A
+response with success 0 raises APIError. Dates default to today.
+"""
+
+from datetime import date, timedelta
+
+from attendance import AttendanceColumns
+from classcharts import (
+    Announcements,
+    APIError,
+    AttendanceData,
+    AttendanceMeta,
+    Detentions,
+    Homework,
+    Student,
+    Timetable,
+)
+
+# pylint: disable=import-outside-toplevel
+
+
+def since(days):
+    """The date `days` days before today, the start of a --days window."""
+    return date.today() - timedelta(days=days)
+
+
+def _data(response):
+    """The data of a successful response; raise APIError otherwise."""
+    if response.get("success") != 1:
+        raise APIError(response.get("error") or "ClassCharts request failed")
+    return response["data"]
+
+
+class HomeworkList(list):
+    """Homework models plus the response's this-week counts."""
+
+    def __init__(self, homework, meta):
+        super().__init__(homework)
+        self.due_count = meta.get("this_week_due_count")
+        self.completed_count = meta.get("this_week_completed_count")
+        self.outstanding_count = meta.get("this_week_outstanding_count")
+
+
+class Attendance:
+    """An /attendance response: the range's AttendanceMeta and every session."""
+
+    __slots__ = ("meta", "data")
+
+    def __init__(self, meta, data):
+        self.meta = meta
+        self.data = data
+
+    def sessions(self):
+        """Yield (date, session name, AttendanceData) for every session."""
+        # an empty range comes back as data: []
+        for attendance_date, sessions in (self.data or {}).items():
+            for attendance_session, values in sessions.items():
+                yield attendance_date, attendance_session, AttendanceData.from_api(
+                    values
+                )
+
+    def columns(self, student_id=0):
+        """The sessions as AttendanceColumns, for statistics."""
+        return AttendanceColumns.from_api(self.data, student_id)
+
+
+def get_pupils(session):
+    """Return the account's pupils as Student models."""
+    return [Student.from_api(student) for student in _data(session.get("pupils"))]
+
+
+def iter_activity(session, student_id, from_date, to_date=None):
+    """Yield every Activity between two dates, one page at a time."""
+    return session.iter_activity(student_id, from_date, to_date or date.today())
+
+
+def get_announcements(session, student_id):
+    """Return a pupil's announcements as Announcements models."""
+    response = session.get(f"announcements/{student_id}")
+    return [Announcements.from_api(entry) for entry in _data(response)]
+
+
+def get_attendance(session, student_id, from_date, to_date=None):
+    """Return a pupil's Attendance between two dates."""
+    response = session.get(
+        f"attendance/{student_id}?from={from_date}&to={to_date or date.today()}"
+    )
+    data = _data(response)
+    return Attendance(AttendanceMeta.from_api(response["meta"]), data)
+
+
+def get_detentions(session, student_id):
+    """Return a pupil's detentions as Detentions models."""
+    response = session.get(f"detentions/{student_id}")
+    return [Detentions.from_api(entry) for entry in _data(response)]
+
+
+def get_homework(
+    session, student_id, from_date, to_date=None, display_date="issue_date"
+):
+    """Return a HomeworkList of the homework whose display_date (issue_date
+    or due_date) falls between two dates."""
+    response = session.get(
+        f"homeworks/{student_id}/?display_date={display_date}"
+        f"&from={from_date}&to={to_date or date.today()}"
+    )
+    homework = [Homework.from_api(entry) for entry in _data(response)]
+    return HomeworkList(homework, response.get("meta") or {})
+
+
+def get_timetable_day(session, student_id, day=None):
+    """Return (lessons, timetable dates) for one day. Lessons are Timetable
+    models with start and end times filled in from the day's periods; the
+    dates are every day the timetable covers around `day`."""
+    response = session.get(f"timetable/{student_id}/?date={day or date.today()}")
+    data = _data(response)
+    meta = response["meta"]
+    periods = {period["number"]: period for period in meta.get("periods") or []}
+    lessons = []
+    for entry in data:
+        lesson = Timetable.from_api(entry)
+        if lesson.period_number in periods:
+            lesson.start_time = periods[lesson.period_number]["start_time"]
+            lesson.end_time = periods[lesson.period_number]["end_time"]
+        lessons.append(lesson)
+    return lessons, meta.get("timetable_dates") or []
+
+
+def iter_timetable_days(session, student_id, day=None, concurrency=1):
+    """Yield (date, lessons) for every day the timetable around `day` covers,
+    in date order. The response for `day` itself is reused; the other days
+    are fetched up to `concurrency` at a time."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    day = str(day or date.today())
+    first, timetable_dates = get_timetable_day(session, student_id, day)
+    others = [
+        timetable_day for timetable_day in timetable_dates if timetable_day != day
+    ]
+
+    def lessons(timetable_day):
+        return get_timetable_day(session, student_id, timetable_day)[0]
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        fetched = executor.map(lessons, others)
+        for timetable_day in timetable_dates:
+            if timetable_day == day:
+                yield timetable_day, first
+            else:
+                yield timetable_day, next(fetched)
+
+
+def iter_timetable_range(session, student_id, day=None, concurrency=1):
+    """Yield the lessons of every day the timetable around `day` covers, in
+    date order; days are fetched up to `concurrency` at a time."""
+    for _, lessons in iter_timetable_days(session, student_id, day, concurrency):
+        yield from lessons
+
+
+def get_timetable_range(session, student_id, day=None, concurrency=1):
+    """Return the lessons of every day the timetable around `day` covers."""
+    return list(iter_timetable_range(session, student_id, day, concurrency))
+
+
+def get_academicreport(session, student_id):
+    """Return a pupil's academic report data."""
+    return _data(session.get(f"getacademicreport/{student_id}"))
+
+
+def get_badges(session, student_id):
+    """Return a pupil's event badges data."""
+    return _data(session.get(f"eventbadges/{student_id}"))
+
+
+def get_behaviour(session, student_id, from_date, to_date=None):
+    """Return a pupil's behaviour data between two dates."""
+    return _data(
+        session.get(
+            f"behaviour/{student_id}/?from={from_date}&to={to_date or date.today()}"
+        )
+    )
+
+
+def get_classes(session, student_id):
+    """Return a pupil's classes data."""
+    return _data(session.get(f"classes/{student_id}"))
+
+
+def get_customfields(session, student_id):
+    """Return a pupil's custom fields data."""
+    return _data(session.get(f"customfields/{student_id}"))
@@ -0,0 +1,184 @@
+"""ClassCharts streaming exporters."""
+
+import csv
+import json
+import sys
+
+# pylint: disable=import-outside-toplevel
+
+
+def _scalar(value):
+    """Encode nested lists and dicts as JSON so every cell is a scalar."""
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value)
+    return value
+
+
+class Exporter:
+    """Base class for streaming exporters.
+    Rows are dicts written one at a time as they are fetched; the field list
+    is taken from the first row unless given up front, and an export with no
+    rows still records the fields given up front."""
+
+    extension = ""
+
+    def __init__(self, path, fields=None):
+        self.path = path
+        self.fields = list(fields) if fields else None
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, row):
+        """Write one row."""
+        if self.fields is None:
+            self.fields = list(row)
+        self._write(row)
+        self.rows += 1
+
+    def write_all(self, rows):
+        """Write every row of an iterable as it is produced."""
+        for row in rows:
+            self.write(row)
+
+    def close(self):
+        """Flush and close the output."""
+
+    def _write(self, row):
+        raise NotImplementedError
+
+    def _open(self):
+        """Open the output path as text, or stdout for "-"."""
+        if self.path == "-":
+            return sys.__stdout__
+        return open(self.path, "w", encoding="utf-8", newline="")
+
+
+class CsvExporter(Exporter):
+    """CSV exporter; nested values are written as JSON."""
+
+    extension = "csv"
+
+    def __init__(self, path, fields=None):
+        super().__init__(path, fields)
+        self._stream = self._open()
+        self._writer = None
+
+    def _write(self, row):
+        if self._writer is None:
+            self._writer = csv.writer(self._stream)
+            self._writer.writerow(self.fields)
+        self._writer.writerow([_scalar(row.get(field)) for field in self.fields])
+
+    def close(self):
+        if self._writer is None and self.fields:
+            # no rows: still write the header
+            csv.writer(self._stream).writerow(self.fields)
+        self._stream.flush()
+        if self._stream is not sys.__stdout__:
+            self._stream.close()
+
+
+class JsonlExporter(Exporter):
+    """JSON Lines exporter, one object per row."""
+
+    extension = "jsonl"
+
+    def __init__(self, path, fields=None):
+        super().__init__(path, fields)
+        self._stream = self._open()
+
+    def _write(self, row):
+        self._stream.write(json.dumps(row, default=str) + "\n")
+
+    def close(self):
+        self._stream.flush()
+        if self._stream is not sys.__stdout__:
+            self._stream.close()
+
+
+class ParquetExporter(Exporter):
+    """Parquet exporter written in row groups of row_group_size rows.
+    Needs the optional pyarrow package; nested values are stored as JSON."""
+
+    extension = "parquet"
+
+    def __init__(self, path, fields=None, row_group_size=10000):
+        super().__init__(path, fields)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as err:
+            raise SystemExit(
+                "Parquet export needs pyarrow: pip install pyarrow"
+            ) from err
+        if path == "-":
+            raise SystemExit("Parquet cannot be written to stdout; use --output")
+        self._pyarrow = pyarrow
+        self._parquet = pyarrow.parquet
+        self.row_group_size = row_group_size
+        self._buffer = []
+        self._writer = None
+
+    def _write(self, row):
+        self._buffer.append({field: _scalar(row.get(field)) for field in self.fields})
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        """Write the buffered rows as one row group."""
+        if not self._buffer:
+            return
+        pyarrow = self._pyarrow
+        if self._writer is None:
+            # the first row group fixes the schema; all-null columns become strings
+            inferred = pyarrow.Table.from_pylist(self._buffer).schema
+            schema = pyarrow.schema(
+                [
+                    (
+                        pyarrow.field(field.name, pyarrow.string())
+                        if pyarrow.types.is_null(field.type)
+                        else field
+                    )
+                    for field in inferred
+                ]
+            )
+            self._writer = self._parquet.ParquetWriter(self.path, schema)
+        schema = self._writer.schema
+        strings = [
+            field.name for field in schema if pyarrow.types.is_string(field.type)
+        ]
+        for row in self._buffer:
+            for name in strings:
+                if row.get(name) is not None:
+                    row[name] = str(row[name])
+        table = pyarrow.Table.from_pylist(self._buffer, schema=schema)
+        self._writer.write_table(table)
+        self._buffer = []
+
+    def close(self):
+        self._flush()
+        if self._writer is None:
+            # no rows: write an empty file whose columns are all strings
+            pyarrow = self._pyarrow
+            schema = pyarrow.schema(
+                [(field, pyarrow.string()) for field in self.fields or []]
+            )
+            self._writer = self._parquet.ParquetWriter(self.path, schema)
+        self._writer.close()
+
+
+EXPORTERS = {
+    "csv": CsvExporter,
+    "jsonl": JsonlExporter,
+    "parquet": ParquetExporter,
+}
+
+
+def open_exporter(export_format, path, fields=None):
+    """Return the exporter for a format name writing to path ("-" is stdout)."""
+    return EXPORTERS[export_format](path, fields)
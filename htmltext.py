@@ -0,0 +1,89 @@
+"""HTML to plain text for ClassCharts descriptions."""
+
+import hashlib
+from html.parser import HTMLParser
+
+# pylint: disable=import-outside-toplevel
+# pylint: disable=global-statement
+
+_LXML_HTML = None
+
+# uncached fragments in a batch before it is spread over worker processes
+PARALLEL_MIN = 32
+
+
+class _TextParser(HTMLParser):
+    """Collects the text nodes of an HTML fragment."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+
+    def handle_data(self, data):
+        self.parts.append(data)
+
+
+def _stdlib_text(markup):
+    """Text content of an HTML fragment using only the standard library."""
+    parser = _TextParser()
+    parser.feed(markup)
+    parser.close()
+    return "".join(parser.parts)
+
+
+def html_to_text(markup):
+    """Return the text content of an HTML fragment, like lxml's text_content().
+    lxml is imported on first use when installed; otherwise (or for markup
+    lxml cannot parse) the standard library parser is used."""
+    global _LXML_HTML
+    if not markup:
+        return ""
+    if _LXML_HTML is None:
+        try:
+            from lxml import html
+        except ImportError:
+            html = False
+        _LXML_HTML = html
+    if _LXML_HTML:
+        try:
+            return _LXML_HTML.fromstring(markup).text_content()
+        except (ValueError, _LXML_HTML.etree.ParserError):
+            pass
+    return _stdlib_text(markup)
+
+
+def markup_digest(markup):
+    """SHA-256 of an HTML fragment, the key its text is cached under."""
+    return hashlib.sha256(markup.encode()).hexdigest()
+
+
+def html_to_texts(markups, cache=None, workers=1):
+    """Return the text content of each HTML fragment, in order.
+    Identical fragments are converted once. With a cache (a
+    cache.TextCache) text is looked up by the SHA-256 of the markup and only
+    fragments never seen before are parsed and stored. With workers > 1 a
+    batch of at least PARALLEL_MIN of those is parsed on a process pool;
+    parsing holds the GIL, so threads would not help."""
+    markups = list(markups)
+    digests = [markup_digest(markup) if markup else None for markup in markups]
+    unique = {digest: markup for digest, markup in zip(digests, markups) if digest}
+    texts = cache.get_many(list(unique)) if cache is not None else {}
+    missing = [digest for digest in unique if digest not in texts]
+    if missing:
+        pending = [unique[digest] for digest in missing]
+        if workers > 1 and len(pending) >= PARALLEL_MIN:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                converted = executor.map(
+                    html_to_text,
+                    pending,
+                    chunksize=max(1, len(pending) // (workers * 4)),
+                )
+                converted = dict(zip(missing, converted))
+        else:
+            converted = dict(zip(missing, map(html_to_text, pending)))
+        texts.update(converted)
+        if cache is not None:
+            cache.set_many(converted)
+    return [texts[digest] if digest else "" for digest in digests]
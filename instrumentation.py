@@ -0,0 +1,235 @@
+"""ClassCharts request instrumentation and tracing."""
+
+from contextlib import contextmanager
+import threading
+import time
+from urllib.parse import urlparse
+
+# pylint: disable=import-outside-toplevel
+
+# request latency histogram buckets, in seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def endpoint(url):
+    """API endpoint of a request URL: its last path segment that is not a
+    student_id, e.g. "timetable" for .../apiv2parent/timetable/123/, whatever
+    the depth of the API's base path."""
+    parts = [part for part in urlparse(url).path.split("/") if part]
+    for part in reversed(parts):
+        if not part.isdigit():
+            return part
+    return ""
+
+
+class Span:
+    """One timed operation, modelled on an OpenTelemetry span.
+    attributes carry per-operation details such as endpoint, status, bytes,
+    retries and cache; parent is the span that was active when it started."""
+
+    __slots__ = ("name", "attributes", "parent", "start_ns", "end_ns", "_started")
+
+    def __init__(self, name, attributes, parent=None):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._started = time.perf_counter()
+
+    def set(self, **attributes):
+        """Add or replace attributes."""
+        self.attributes.update(attributes)
+
+    def finish(self):
+        """Record the end time and return the duration in seconds."""
+        duration = time.perf_counter() - self._started
+        self.end_ns = self.start_ns + int(duration * 1e9)
+        return duration
+
+    @property
+    def duration(self):
+        """Duration in seconds, or None while the span is open."""
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e9
+
+    @property
+    def label(self):
+        """Name qualified by endpoint, used to group the profile."""
+        name = self.attributes.get("endpoint")
+        return f"{self.name} {name}" if name else self.name
+
+    def __str__(self):
+        return f"{self.label} - {self.duration}s"
+
+
+class Instrumentation:
+    """Span tracer and metric aggregator for a run.
+    Every finished span is passed to the registered hooks (callables taking
+    the span) and folded into per-phase timings and per-endpoint request
+    metrics, which can be printed as a profile or exported for Prometheus."""
+
+    def __init__(self):
+        self.hooks = []
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.requests = {}
+        self.latency = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """Call hook(span) for every finished span."""
+        self.hooks.append(hook)
+        return hook
+
+    def current(self):
+        """The innermost open span on this thread, or None."""
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def annotate(self, **attributes):
+        """Set attributes on the current span, if there is one."""
+        span = self.current()
+        if span is not None:
+            span.set(**attributes)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the enclosed block as a span nested under the current one."""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        span = Span(name, attributes, stack[-1] if stack else None)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as err:
+            span.set(error=type(err).__name__)
+            raise
+        finally:
+            stack.pop()
+            self._record(span, span.finish())
+            for hook in self.hooks:
+                hook(span)
+
+    def _record(self, span, duration):
+        """Fold a finished span into the phase and request metrics."""
+        attributes = span.attributes
+        with self._lock:
+            phase = self.phases.setdefault(span.label, [0, 0.0, 0.0])
+            phase[0] += 1
+            phase[1] += duration
+            phase[2] = max(phase[2], duration)
+            if span.name != "http.request":
+                return
+            key = (
+                attributes.get("endpoint", ""),
+                attributes.get("method", ""),
+                str(attributes.get("status", attributes.get("error", "none"))),
+                attributes.get("cache", "none"),
+            )
+            totals = self.requests.setdefault(key, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += attributes.get("bytes", 0)
+            totals[2] += attributes.get("retries", 0)
+            histogram = self.latency.setdefault(
+                attributes.get("endpoint", ""), [0] * (len(BUCKETS) + 1) + [0.0]
+            )
+            for index, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    histogram[index] += 1
+            histogram[len(BUCKETS)] += 1
+            histogram[-1] += duration
+
+    def profile(self):
+        """Per-phase timing rows, slowest total first, as lists for tabulating."""
+        wall = time.perf_counter() - self.started
+        rows = [["Phase", "Count", "Total s", "Mean ms", "Max ms", "% of run"]]
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda item: -item[1][1])
+        for label, (count, total, longest) in phases:
+            rows.append(
+                [
+                    label,
+                    count,
+                    f"{total:.3f}",
+                    f"{total / count * 1000:.1f}",
+                    f"{longest * 1000:.1f}",
+                    f"{100 * total / wall:.1f}" if wall else "-",
+                ]
+            )
+        rows.append(["run", 1, f"{wall:.3f}", "", "", "100.0"])
+        return rows
+
+    def prometheus(self):
+        """Request metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP classcharts_requests_total ClassCharts API requests.",
+            "# TYPE classcharts_requests_total counter",
+        ]
+        with self._lock:
+            requests = sorted(self.requests.items())
+            latency = sorted(self.latency.items())
+        for (name, method, status, cache), (count, _, _) in requests:
+            lines.append(
+                f'classcharts_requests_total{{endpoint="{name}",method="{method}",'
+                f'status="{status}",cache="{cache}"}} {count}'
+            )
+        for metric, index, description in (
+            ("response_bytes_total", 1, "Response body bytes received."),
+            ("retries_total", 2, "Request attempts retried."),
+        ):
+            lines.append(f"# HELP classcharts_{metric} {description}")
+            lines.append(f"# TYPE classcharts_{metric} counter")
+            per_endpoint = {}
+            for (name, *_), totals in requests:
+                per_endpoint[name] = per_endpoint.get(name, 0) + totals[index]
+            for name, value in per_endpoint.items():
+                lines.append(f'classcharts_{metric}{{endpoint="{name}"}} {value}')
+        lines.append(
+            "# HELP classcharts_request_duration_seconds ClassCharts API request latency."
+        )
+        lines.append("# TYPE classcharts_request_duration_seconds histogram")
+        for name, histogram in latency:
+            for bound, count in zip(BUCKETS, histogram):
+                lines.append(
+                    f"classcharts_request_duration_seconds_bucket"
+                    f'{{endpoint="{name}",le="{bound}"}} {count}'
+                )
+            count = histogram[len(BUCKETS)]
+            lines.append(
+                f"classcharts_request_duration_seconds_bucket"
+                f'{{endpoint="{name}",le="+Inf"}} {count}'
+            )
+            lines.append(
+                f'classcharts_request_duration_seconds_sum{{endpoint="{name}"}} '
+                f"{histogram[-1]:.6f}"
+            )
+            lines.append(
+                f'classcharts_request_duration_seconds_count{{endpoint="{name}"}} {count}'
+            )
+        return "\n".join(lines) + "\n"
+
+
+def opentelemetry_hook(tracer=None):
+    """Return a hook re-emitting spans through an OpenTelemetry tracer.
+    Needs the optional opentelemetry-api package."""
+    try:
+        from opentelemetry import trace
+    except ImportError as err:
+        raise SystemExit(
+            "OpenTelemetry export needs opentelemetry-api: pip install opentelemetry-api"
+        ) from err
+    tracer = tracer or trace.get_tracer("classcharts")
+
+    def hook(span):
+        otel_span = tracer.start_span(
+            span.name,
+            start_time=span.start_ns,
+            attributes={key: str(value) for key, value in span.attributes.items()},
+        )
+        otel_span.end(end_time=span.end_ns)
+
+    return hook
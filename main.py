@@ -8,582 +8,772 @@ Commands:
     academicreport: get student academic report
     activity: get activity for the last n days (default 30)
     announcements: get announcements
+    api: serve pupils' data as a local JSON API
+    attachments: download every pupil's announcement and homework attachments
     attendance: get attendance
     badges: get badges
     behaviour: get behaviour for the last n days (default 30)
+    changes: report new, changed and removed homework, detentions and announcements
     classes: get classes
     customfields: get student customfields
     detentions: get detentions
     homework: get homework for the last n days (default 30)
+    report: activity score breakdowns by polarity, reason, lesson, teacher and week
+    serve: keep polling every pupil's endpoints into the local store
+    snapshot: fetch every endpoint at once and save one JSON document per pupil
+    sync: sync new activity, homework, detentions and attendance locally
     timetable: get timetable
 
 Options:
+    --pool_size: number of pooled HTTP connections (default 10)
+    --no_keep_alive: close the HTTP connection after every request
+    --retries: times to retry a failed or throttled request (default 3)
+    --rate: maximum requests per second across all workers
+    --burst: requests allowed back to back before --rate applies
+    --force_login: log in again instead of reusing the saved session
+    --no_cache: do not read or write the local response cache
+    --refresh: re-download cached endpoints and update the cache
+    --profile: print a per-phase timing breakdown to stderr at exit
+    --metrics: write Prometheus request metrics to a file at exit
+    --html_workers: processes converting uncached descriptions (default 1)
+    --all_pupils: run the command for every pupil, saving output per pupil
+    --workers: number of pupils to export at once (default 4)
+    --output_dir: directory for --all_pupils output files
     --days: number of days to query
     --csv: save data to CSV file
     --display_date: display date for homework (issue_date or due_date)
     --number: number of homework assignment to view
     --date: date to query timetable
+    --concurrency: number of timetable days to fetch at once
+    --format: export the data as csv, jsonl or parquet instead of printing it
+    --output: file to export to, or - for stdout
+    --top: number of reasons, lessons and teachers in a report
+    --period: weeks per period when comparing report trends
+    --combined: aggregate every pupil into one report
+    --overlap: days before the last sync to fetch again
+    --interval: seconds between serve polls of an endpoint (endpoint=seconds)
+    --jitter: fraction serve poll intervals vary by
+    --host: address the api listens on (default 127.0.0.1)
+    --port: port the api listens on (default 8080)
+    --poll: keep the api's data current with the serve scheduler
+    --sink: where changes go: stdout, jsonl:<path> or webhook:<url>
+    --baseline: record the current data without reporting it as changes
+    --dir: directory attachments are stored in
+    --endpoints: endpoints to include in a snapshot or change report
 
 Examples:
     python main.py activity --days 30 --csv
     python main.py homework --days 30 --display_date issue_date
     python main.py timetable --date 2021-09-01
+    python main.py timetable --concurrency 8
+    python main.py --all_pupils --output_dir export homework --days 7
+    python main.py activity --days 365 --format jsonl --output -
+    python main.py serve --interval activity=600 --concurrency 2
+    python main.py api --port 8080 --poll
+    python main.py attachments --days 90 --concurrency 8
+    python main.py --all_pupils --output_dir snapshots snapshot --format jsonl
 """
 
 import argparse
+import atexit
 import csv
 from datetime import datetime, date, timedelta
+from itertools import chain
 import os
-import requests
+import signal
+import sys
+import threading
 
-# helper classes
-from lxml import html
+# helper classes; modules pulling in heavy dependencies (requests, sqlite3,
+# http.server, numpy, lxml) are imported by the commands that use them
+from changes import ENDPOINTS as CHANGE_ENDPOINTS
+from exporters import EXPORTERS, open_exporter
+from instrumentation import Instrumentation
+from render import tabulate
 from classcharts import (
     Activity,
-    AttendanceData,
-    AttendanceMeta,
     Announcements,
+    APIError,
+    AttendanceData,
     Detentions,
     Homework,
+    RequestPolicy,
     Session,
-    Student,
     Timetable,
+    TOKEN_FILE,
 )
+import client
 
-API_URL = os.getenv("api_url", "")
+# endpoints fetched by the snapshot command
+SNAPSHOT_ENDPOINTS = (
+    "academicreport",
+    "activity",
+    "announcements",
+    "attendance",
+    "badges",
+    "behaviour",
+    "classes",
+    "customfields",
+    "detentions",
+    "homework",
+    "timetable",
+)
+
+# rows sampled for column widths when a table is streamed
+STREAM_SAMPLE = 100
 
 # pylint: disable=line-too-long
 # pylint: disable=too-many-locals
 # pylint: disable=consider-using-enumerate
 # pylint: disable=too-many-branches
 # pylint: disable=expression-not-assigned
+# pylint: disable=import-outside-toplevel
 
 
-def _tabulate(data):
-    """Tabulate data - data is an array (rows) or arrays (columns)"""
-    lengths = [0] * len(data[0])
-    for row in data:
-        for ind in range(len(row)):
-            if len(str(row[ind])) > lengths[ind]:
-                lengths[ind] = len(str(row[ind]))
-    for row in data:
-        for ind in range(len(row)):
-            print(str(row[ind]), end=" ")
-            print(" " * (lengths[ind] - len(str(row[ind]))), end=" ")
-        print("")
+class _PupilOutput(threading.local):
+    """Per-thread output stream used while exporting every pupil."""
 
+    stream = None
 
-def _make_request(method, url, header, data=None):
-    """Make a request to ClassCharts API."""
-    try:
-        response = requests.request(method, url, headers=header, data=data, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as err:
-        raise SystemExit(err) from err
-
-
-def _get_academicreport(session_id, student_id):
-    """Get student academic report."""
-    url = f"{API_URL}/getacademicreport/{student_id}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    response = _make_request("GET", url, header=headers)
-    if response["success"] == 1:
-        if response["data"]:
-            print(f"Custom fields: {response}")
-        else:
-            print("No custom fields found.")
-    print(response["error"])
 
+_PUPIL_OUTPUT = _PupilOutput()
+_INSTRUMENTATION = Instrumentation()
+# cache.TextCache of converted descriptions, opened unless --no_cache
+_TEXT_CACHE = None
+# processes converting uncached descriptions, set by --html_workers
+_HTML_WORKERS = 1
+
+
+class _PupilStdout:
+    """sys.stdout proxy sending each worker's prints to its own pupil file."""
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+    def write(self, text):
+        """Write to the current worker's pupil file, or the real stdout."""
+        return (_PUPIL_OUTPUT.stream or self.stdout).write(text)
+
+    def flush(self):
+        """Flush the current worker's pupil file, or the real stdout."""
+        (_PUPIL_OUTPUT.stream or self.stdout).flush()
 
-def _get_activity(session_id, student_id, days=30, save_csv=False):
-    """Get student activity."""
-    today = date.today()
-    from_date = today - timedelta(days=days)
-    last_id = 0
-    url = f"{API_URL}/activity/{student_id}/?from={from_date}&to={today}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    response = _make_request("GET", url, header=headers)
-    if response["success"] == 1:
-        activities = []
-        for activity_entry in response["data"]:
-            activities.append(Activity(**activity_entry))
-        while last_id != activities[-1].id:
-            header = [
-                "ID",
-                "Timestamp",
-                "Type",
-                "Polarity",
-                "Reason",
-                "Score",
-                "Lesson Name",
-                "Teacher",
-                "Notes",
-            ]
-            activity_data = [header]
-            for activity in activities:
-                act = [
-                    activity.id,
-                    activity.timestamp,
-                    activity.type,
-                    activity.polarity,
-                    activity.reason,
-                    activity.score,
-                    activity.lesson_name,
-                    activity.teacher_name,
-                    activity.note,
-                ]
-                activity_data.append(act)
-                last_id = activity.id
-            url = f"{API_URL}/activity/{student_id}/?from={from_date}&to={today}&last_id={last_id}"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Basic {session_id}",
-            }
-            response = _make_request("GET", url, header=headers)
-            for activity_entry in response["data"]:
-                activities.append(Activity(**activity_entry))
-        if save_csv:
-            csv_file = "activity.csv"
-            with open(csv_file, "w", encoding="utf-8") as csv_file:
-                csv_writer = csv.writer(csv_file)
-                csv_writer.writerow(header)
-                for activity in activities:
-                    csv_writer.writerow(
-                        [
-                            activity.id,
-                            activity.timestamp,
-                            activity.type,
-                            activity.polarity,
-                            activity.reason,
-                            activity.score,
-                            activity.lesson_name,
-                            activity.teacher_name,
-                            activity.note,
-                        ]
-                    )
-            print(f"Activity saved to {csv_file}")
-            return
-        _tabulate(activity_data)
-        print()
 
+def _tabulate(data, sample=None):
+    """Tabulate data - data is an array (rows) or arrays (columns), or any
+    iterable of rows. With sample, column widths are fixed from the first
+    `sample` rows and later rows are printed as they arrive."""
+    with _INSTRUMENTATION.span("render") as span:
+        span.set(rows=tabulate(data, sample=sample))
 
-def _get_announcements(session_id, student_id):
+
+def _descriptions(markups):
+    """Plain text of a batch of HTML descriptions, converted in one pass and
+    memoised by content hash in the local text cache."""
+    from htmltext import html_to_texts
+
+    with _INSTRUMENTATION.span("render.html", fragments=len(markups)):
+        return html_to_texts(markups, cache=_TEXT_CACHE, workers=_HTML_WORKERS)
+
+
+def _get_academicreport(session, student_id):
+    """Print a pupil's academic report."""
+    report = client.get_academicreport(session, student_id)
+    if report:
+        print(f"Academic report: {report}")
+    else:
+        print("No academic report found.")
+
+
+def _get_activity(
+    session,
+    student_id,
+    days=30,
+    save_csv=False,
+    csv_file="activity.csv",
+    stream=False,
+):
+    """Get student activity.
+    Rows are consumed page by page from client.iter_activity; CSV rows are
+    written as each page arrives, and so are table rows with stream (column
+    widths then come from the first STREAM_SAMPLE rows)."""
+    header = [
+        "ID",
+        "Timestamp",
+        "Type",
+        "Polarity",
+        "Reason",
+        "Score",
+        "Lesson Name",
+        "Teacher",
+        "Notes",
+    ]
+    rows = (
+        [
+            activity.id,
+            activity.timestamp,
+            activity.type,
+            activity.polarity,
+            activity.reason,
+            activity.score,
+            activity.lesson_name,
+            activity.teacher_name,
+            activity.note,
+        ]
+        for activity in client.iter_activity(session, student_id, client.since(days))
+    )
+    if save_csv:
+        with open(csv_file, "w", encoding="utf-8") as output:
+            csv_writer = csv.writer(output)
+            csv_writer.writerow(header)
+            csv_writer.writerows(rows)
+        print(f"Activity saved to {csv_file}")
+        return
+    _tabulate(chain([header], rows), sample=STREAM_SAMPLE if stream else None)
+    print()
+
+
+def _get_announcements(session, student_id):
     """Get announcements."""
-    url = f"{API_URL}/announcements/{student_id}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    response = _make_request("GET", url, header=headers)
-    if response["success"] == 1:
-        announcements = []
-        for announcement in response["data"]:
-            announcements.append(Announcements(**announcement))
-        for announcement in announcements:
-            print(f"Title: {announcement.title} ({announcement.teacher_name})")
-            print(f"Date: {announcement.timestamp}")
-            print(f"Requires consent: {announcement.requires_consent}")
-            print("-" * len(f"Date: {announcement.timestamp}"))
+    announcements = client.get_announcements(session, student_id)
+    descriptions = _descriptions(
+        [announcement.description for announcement in announcements]
+    )
+    for announcement, description in zip(announcements, descriptions):
+        print(f"Title: {announcement.title} ({announcement.teacher_name})")
+        print(f"Date: {announcement.timestamp}")
+        print(f"Requires consent: {announcement.requires_consent}")
+        print("-" * len(f"Date: {announcement.timestamp}"))
+        print(f"Description: {description}")
+        print("-" * len(f"Date: {announcement.timestamp}"))
+        (
             print(
-                f"Description: {html.fromstring(announcement.description).text_content()}"
+                f"Attachments - Filename: {announcement.attachments[0]['filename']}, URL: {announcement.attachments[0]['url']}"
             )
-            print("-" * len(f"Date: {announcement.timestamp}"))
-            (
-                print(
-                    f"Attachments - Filename: {announcement.attachments[0]['filename']}, URL: {announcement.attachments[0]['url']}"
-                )
-                if announcement.attachments
-                else print("Attachments: None")
-            )
-            print()
+            if announcement.attachments
+            else print("Attachments: None")
+        )
+        print()
 
 
-def _get_attendance(session_id, student_id, days):
+def _get_attendance(session, student_id, days):
     """Get attendance."""
-    today = date.today()
-    from_date = today - timedelta(days=days)
-    url = f"{API_URL}/attendance/{student_id}?from={from_date}&to={today}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    response = _make_request("GET", url, header=headers)
-    # attenfance meta data
-    attendance_meta = AttendanceMeta(**response["meta"])
-    # attendance data
-    attendance_data = []
-    attendance_data_complete = {}
-    if response["success"] == 1:
-        attendance_data.append(response["data"])
-    for attendance_date in attendance_meta.dates:
-        for attendance_session in attendance_data[0][attendance_date]:
-            session_data = AttendanceData(
-                **attendance_data[0][attendance_date][attendance_session]
-            )
-            attendance_data_complete[attendance_date] = session_data
-    data_properties = {
-        "yes": 0,
-        "present": 0,
-        "ignore": 0,
-        "no": 0,
-        "absent": 0,
-        "excused": 0,
-        "late": 0,
-    }
-    late_minutes = 0
-    for school_day_data in attendance_data_complete.values():
-        if school_day_data.status == "yes":
-            data_properties["yes"] += 1
-        if school_day_data.status == "present":
-            data_properties["present"] += 1
-        if school_day_data.status == "ignore":
-            data_properties["ignore"] += 1
-        if school_day_data.status == "no":
-            data_properties["no"] += 1
-        if school_day_data.status == "absent":
-            data_properties["absent"] += 1
-        if school_day_data.status == "excused":
-            data_properties["excused"] += 1
-        if school_day_data.status == "late":
-            data_properties["late"] += 1
-            late_minutes += school_day_data.late_minutes
-    print(
-        f"Attendance data for range: {attendance_meta.start_date.split("T")[0]}-{attendance_meta.end_date.split("T")[0]}"
-    )
+    attendance = client.get_attendance(session, student_id, client.since(days))
+    attendance_meta = attendance.meta
+    # every session of every day
+    columns = attendance.columns(student_id)
+    summary = columns.summary()
+    counts = summary.status_counts
+    start_date = attendance_meta.start_date.split("T")[0]
+    end_date = attendance_meta.end_date.split("T")[0]
+    print(f"Attendance data for range: {start_date}-{end_date}")
     print()
-    print(f"Total days present: {data_properties['present']}")
-    print(f"Total days absent: {data_properties['absent']}")
-    print(f"Total days excused: {data_properties['excused']}")
-    print(f"Total days ignored: {data_properties['ignore']}")
-    print(f"Total days late: {data_properties['late']}")
-    print(f"Total minutes late: {late_minutes}") if late_minutes > 0 else print()
-    print(f"Total days: {sum(x for x in data_properties.values() if x > 0)}")
+    print(f"Total sessions present: {counts['present'] + counts['yes']}")
+    print(f"Total sessions absent: {counts['absent'] + counts['no']}")
+    print(f"Total sessions excused: {counts['excused']}")
+    print(f"Total sessions ignored: {counts['ignore']}")
+    print(f"Total sessions late: {counts['late']}")
+    (
+        print(f"Total minutes late: {summary.late_minutes}")
+        if summary.late_minutes > 0
+        else print()
+    )
+    print(f"Total sessions: {len(columns)} over {len(summary.day_counts)} days")
     print()
     print(f"Percentage attendance of date range: {attendance_meta.percentage}%")
     print(
         f"Percentage attendance since August: {attendance_meta.percentage_since_august}%"
     )
     print()
+    week_data = [["Week", "Days", "Sessions", "Attended", "Percentage"]]
+    for (year, week), totals in sorted(summary.weeks.items()):
+        week_data.append(
+            [
+                f"{year}-W{week:02d}",
+                totals["days"],
+                totals["counted"],
+                totals["attended"],
+                f"{totals['percentage']}%",
+            ]
+        )
+    _tabulate(week_data)
+    print()
 
 
-def _get_badges(session_id, student_id):
+def _get_badges(session, student_id):
     """Get badges."""
-    url = f"{API_URL}/eventbadges/{student_id}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    response = _make_request("GET", url, header=headers)
-    if response["success"] == 1:
-        if response["data"]:
-            print(f"Badges: {response}")
-        else:
-            print("No badges found.")
+    badges = client.get_badges(session, student_id)
+    if badges:
+        print(f"Badges: {badges}")
+    else:
+        print("No badges found.")
 
 
-def _get_behaviour(session_id, student_id, days=90):
+def _get_behaviour(session, student_id, days=90):
     """Get student behaviour."""
-    today = date.today()
-    from_date = today - timedelta(days=days)
-    url = f"{API_URL}/behaviour/{student_id}/?from={from_date}&to={today}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    response = _make_request("GET", url, header=headers)
-    if response["success"] == 1:
-        print(f"Behaviour: {response}")
+    behaviour = client.get_behaviour(session, student_id, client.since(days))
+    print(f"Behaviour: {behaviour}")
 
 
-def _get_classes(session_id, student_id):
+def _get_classes(session, student_id):
     """Get all classes."""
-    url = f"{API_URL}/classes/{student_id}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    response = _make_request("GET", url, header=headers)
-    if response["success"] == 1:
-        print(f"Classes: {response}")
-    else:
+    try:
+        classes = client.get_classes(session, student_id)
+    except APIError as err:
         print("No classes found.")
-        print(response["error"])
+        print(err)
+        return
+    print(f"Classes: {classes}")
 
 
-def _get_customfields(session_id, student_id):
+def _get_customfields(session, student_id):
     """Get student custom fields."""
-    url = f"{API_URL}/customfields/{student_id}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    response = _make_request("GET", url, header=headers)
-    if response["success"] == 1:
-        if response["data"]:
-            print(f"Custom fields: {response}")
-        else:
-            print("No custom fields found.")
-    print(response["error"])
+    customfields = client.get_customfields(session, student_id)
+    if customfields:
+        print(f"Custom fields: {customfields}")
+    else:
+        print("No custom fields found.")
 
 
-def _get_detentions(session_id, student_id, save_csv=False):
+def _get_detentions(session, student_id, save_csv=False, csv_file="detentions.csv"):
     """Get detentions."""
-    url = f"{API_URL}/detentions/{student_id}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    response = _make_request("GET", url, header=headers)
-    if response["success"] == 1:
-        csv_file = "detentions.csv"
-        detentions = []
-        for detention in response["data"]:
-            detentions.append(Detentions(**detention))
-        detention_header = [
-            "Date",
-            "Time",
-            "Length",
-            "Location",
-            "Lesson",
-            "Type",
-            "Teacher",
-            "Notes",
-        ]
-        detention_data = [detention_header]
-        if save_csv:
-            with open(csv_file, "w", encoding="utf-8") as csv_file:
-                csv_writer = csv.writer(csv_file)
-                csv_writer.writerow(detention_header)
-                for detention in detentions:
-                    if detention.lesson:
-                        lesson = f"{detention.lesson['subject']['name']}"
-                    else:
-                        lesson = "N/A"
-                    if detention.teacher:
-                        teacher = f"{detention.teacher['title']} {detention.teacher['first_name']} {detention.teacher['last_name']}"
-                    else:
-                        teacher = "N/A"
-                    csv_writer.writerow(
-                        [
-                            detention.date,
-                            detention.time,
-                            detention.length,
-                            detention.location,
-                            lesson,
-                            detention.detention_type["name"],
-                            teacher,
-                            detention.notes,
-                        ]
-                    )
-            print(f"Detentions saved to {csv_file}")
-            return
-        for detention in detentions:
-            if detention.lesson:
-                lesson = f"{detention.lesson['name']} ({detention.lesson['subject']['name']})"
-            else:
-                lesson = "N/A"
-            if detention.teacher:
-                teacher = f"{detention.teacher['title']} {detention.teacher['first_name']} {detention.teacher['last_name']}"
-            else:
-                teacher = "N/A"
-            detention_data.append(
-                [
-                    detention.date,
-                    detention.time,
-                    detention.length,
-                    detention.location,
-                    lesson,
-                    detention.detention_type["name"],
-                    teacher,
-                    detention.notes,
-                ]
+    detentions = client.get_detentions(session, student_id)
+    detention_header = [
+        "Date",
+        "Time",
+        "Length",
+        "Location",
+        "Lesson",
+        "Type",
+        "Teacher",
+        "Notes",
+    ]
+    detention_data = [detention_header]
+    if save_csv:
+        with open(csv_file, "w", encoding="utf-8") as output:
+            csv_writer = csv.writer(output)
+            csv_writer.writerow(detention_header)
+            for detention in detentions:
+                if detention.lesson:
+                    lesson = f"{detention.lesson['subject']['name']}"
+                else:
+                    lesson = "N/A"
+                if detention.teacher:
+                    teacher = f"{detention.teacher['title']} {detention.teacher['first_name']} {detention.teacher['last_name']}"
+                else:
+                    teacher = "N/A"
+                csv_writer.writerow(
+                    [
+                        detention.date,
+                        detention.time,
+                        detention.length,
+                        detention.location,
+                        lesson,
+                        detention.detention_type["name"],
+                        teacher,
+                        detention.notes,
+                    ]
+                )
+        print(f"Detentions saved to {csv_file}")
+        return
+    for detention in detentions:
+        if detention.lesson:
+            lesson = (
+                f"{detention.lesson['name']} ({detention.lesson['subject']['name']})"
             )
-        _tabulate(detention_data)
-        print()
+        else:
+            lesson = "N/A"
+        if detention.teacher:
+            teacher = f"{detention.teacher['title']} {detention.teacher['first_name']} {detention.teacher['last_name']}"
+        else:
+            teacher = "N/A"
+        detention_data.append(
+            [
+                detention.date,
+                detention.time,
+                detention.length,
+                detention.location,
+                lesson,
+                detention.detention_type["name"],
+                teacher,
+                detention.notes,
+            ]
+        )
+    _tabulate(detention_data)
+    print()
 
 
-def _get_homework(session_id, student_id, display_type, days, index=None):
+def _get_homework(session, student_id, display_type, days, index=None):
     """Get student homework."""
-    today = date.today()
-    from_date = today - timedelta(days=days)
-    url = f"{API_URL}/homeworks/{student_id}/?display_date={display_type}&from={from_date}&to={today}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    response = _make_request("GET", url, header=headers)
-    if response["success"] == 1:
-        header = [
-            "Number",
-            "Title",
-            "Subject",
-            "Lesson",
-            "Teacher",
-            "Due Date",
-            "Estimated Completion Time",
-            "Status",
-        ]
-        homework_assignment_data = [header]
-        homework_assignments = []
-        for assignment in response["data"]:
-            homework_assignments.append(Homework(**assignment))
-        if index:
-            homework = homework_assignments[index - 1]
-            est_time = (
-                f"{homework.completion_time_value} {homework.completion_time_unit}"
-            )
-            print(f"Selected homework assignment: {index}")
-            print()
-            print(f"Title: {homework.title}")
-            print(f"Subject: {homework.subject}")
-            print(f"Lesson: {homework.lesson}")
-            print(f"Teacher: {homework.teacher}")
-            print(f"Due Date: {homework.due_date}")
-            (
-                print(
-                    f"Estimated Completion Time: {homework.completion_time_value} {homework.completion_time_unit}"
-                )
-                if homework.completion_time_value
-                else print("Estimated Completion Time: n/a")
-            )
-            print(f"Status: {homework.status['state']}")
+    homework_assignments = client.get_homework(
+        session, student_id, client.since(days), display_date=display_type
+    )
+    header = [
+        "Number",
+        "Title",
+        "Subject",
+        "Lesson",
+        "Teacher",
+        "Due Date",
+        "Estimated Completion Time",
+        "Status",
+    ]
+    homework_assignment_data = [header]
+    if index:
+        homework = homework_assignments[index - 1]
+        print(f"Selected homework assignment: {index}")
+        print()
+        print(f"Title: {homework.title}")
+        print(f"Subject: {homework.subject}")
+        print(f"Lesson: {homework.lesson}")
+        print(f"Teacher: {homework.teacher}")
+        print(f"Due Date: {homework.due_date}")
+        (
             print(
-                f"Description: {html.fromstring(homework.description).text_content()}"
+                f"Estimated Completion Time: {homework.completion_time_value} {homework.completion_time_unit}"
             )
-            return
-        for idx, assignment in enumerate(
-            sorted(
-                homework_assignments,
-                key=lambda homework_assignments: homework_assignments.due_date,
-            ),
-            start=1,
-        ):
-            if assignment.homework_type == "Homework":
-                est_time = f"{assignment.completion_time_value} {assignment.completion_time_unit}"
-                hw = [
-                    idx,
-                    assignment.title,
-                    assignment.subject,
-                    assignment.lesson,
-                    assignment.teacher,
-                    assignment.due_date,
-                    est_time if assignment.completion_time_value else "n/a",
-                    assignment.status["state"],
-                ]
-                homework_assignment_data.append(hw)
-        _tabulate(homework_assignment_data)
-        print()
-        print(f"Assignments due this week: {response['meta']['this_week_due_count']}")
-        print(
-            f"Assignments completed this week: {response['meta']['this_week_completed_count']}"
-        )
-        print(
-            f"Assignments outstanding this week: {response['meta']['this_week_outstanding_count']}"
+            if homework.completion_time_value
+            else print("Estimated Completion Time: n/a")
         )
+        print(f"Status: {homework.status['state']}")
+        print(f"Description: {_descriptions([homework.description])[0]}")
+        return
+    for idx, assignment in enumerate(
+        sorted(
+            homework_assignments,
+            key=lambda homework_assignments: homework_assignments.due_date,
+        ),
+        start=1,
+    ):
+        if assignment.homework_type == "Homework":
+            est_time = (
+                f"{assignment.completion_time_value} {assignment.completion_time_unit}"
+            )
+            hw = [
+                idx,
+                assignment.title,
+                assignment.subject,
+                assignment.lesson,
+                assignment.teacher,
+                assignment.due_date,
+                est_time if assignment.completion_time_value else "n/a",
+                assignment.status["state"],
+            ]
+            homework_assignment_data.append(hw)
+    _tabulate(homework_assignment_data)
+    print()
+    print(f"Assignments due this week: {homework_assignments.due_count}")
+    print(f"Assignments completed this week: {homework_assignments.completed_count}")
+    print(
+        f"Assignments outstanding this week: {homework_assignments.outstanding_count}"
+    )
 
 
-def _get_timetable(session_id, student_id, date_required=date.today()):
-    """Get timetable."""
-    url = f"{API_URL}/timetable/{student_id}/?date={date_required}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    # get all timetable dates
-    response = _make_request("GET", url, header=headers)
-    if response["success"] == 1:
-        timetable_dates = []
-        timetable_day_data = []
-        period_data = {}
-        for date_stamp in response["meta"]["timetable_dates"]:
-            timetable_dates.append(date_stamp)
-        for day in timetable_dates:
-            url = f"{API_URL}/timetable/{student_id}/?date={day}"
-            response = _make_request("GET", url, header=headers)
-            for lessons in response["data"]:
-                timetable_day_data.append(Timetable(**lessons))
-            for period in response["meta"]["periods"]:
-                period_data[period["number"]] = [
-                    period["start_time"],
-                    period["end_time"],
-                ]
-        timetable_header = [
-            "Date",
-            "Teacher",
-            "Lesson Name",
-            "Subject",
-            "Period Number",
-            "Room Name",
-            "Start Time",
-            "End Time",
-        ]
-        timetable_data = [timetable_header]
+def _get_timetable(session, student_id, date_required=date.today(), concurrency=1):
+    """Get timetable.
+    Days are fetched up to `concurrency` at a time and merged in date order."""
+    try:
+        lessons = client.get_timetable_range(
+            session, student_id, date_required, concurrency=concurrency
+        )
+    except APIError as err:
+        print("No timetable found.")
+        print(err)
+        return
+    timetable_header = [
+        "Date",
+        "Teacher",
+        "Lesson Name",
+        "Subject",
+        "Period Number",
+        "Room Name",
+        "Start Time",
+        "End Time",
+    ]
+    separator = ["-" * 10] * len(timetable_header)
+    timetable_data = [timetable_header, separator]
+    for lesson in lessons:
         timetable_data.append(
             [
-                "-" * 10,
-                "-" * 10,
-                "-" * 10,
-                "-" * 10,
-                "-" * 10,
-                "-" * 10,
-                "-" * 10,
-                "-" * 10,
+                lesson.date,
+                lesson.teacher_name,
+                lesson.lesson_name,
+                lesson.subject_name,
+                lesson.period_number,
+                lesson.room_name,
+                lesson.start_time,
+                lesson.end_time,
             ]
         )
-        for timetable_day in timetable_day_data:
-            if timetable_day.period_number in period_data:
-                timetable_day.start_time = period_data[timetable_day.period_number][0]
-                timetable_day.end_time = period_data[timetable_day.period_number][1]
-            timetable_data.append(
-                [
-                    timetable_day.date,
-                    timetable_day.teacher_name,
-                    timetable_day.lesson_name,
-                    timetable_day.subject_name,
-                    timetable_day.period_number,
-                    timetable_day.room_name,
-                    timetable_day.start_time,
-                    timetable_day.end_time,
-                ]
-            )
-            if timetable_day.period_number == "5":
-                timetable_data.append(
-                    [
-                        "-" * 10,
-                        "-" * 10,
-                        "-" * 10,
-                        "-" * 10,
-                        "-" * 10,
-                        "-" * 10,
-                        "-" * 10,
-                        "-" * 10,
-                    ]
-                )
-        _tabulate(timetable_data)
+        if lesson.period_number == "5":
+            timetable_data.append(separator)
+    _tabulate(timetable_data)
+    print()
+
+
+def _get_report(session, pupils, days=365, top=5, period=4, concurrency=4):
+    """Print activity score breakdowns for one or more pupils.
+    pupils is a list of (name, student_id); their activity is fetched up to
+    `concurrency` pupils at a time and aggregated together."""
+    from concurrent.futures import ThreadPoolExecutor
+    from reports import ActivityReport
+
+    today = date.today()
+    from_date = today - timedelta(days=days)
+    report = ActivityReport()
+    workers = max(1, min(len(pupils), concurrency))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fetched = executor.map(
+            lambda pupil: list(
+                client.iter_activity(session, pupil[1], from_date, today)
+            ),
+            pupils,
+        )
+        for (name, _), activities in zip(pupils, fetched):
+            report.add(name, activities)
+    print(f"Activity report: {len(report)} entries from {from_date} to {today}")
+    print()
+    sections = [("Polarity", report.totals_by("polarity"))]
+    if len(report.pupils) > 1:
+        sections.append(("Pupil", report.totals_by("pupil")))
+    sections += [
+        ("Reason", report.top("reason", top)),
+        ("Lesson", report.totals_by("lesson_name")[:top]),
+        ("Teacher", report.totals_by("teacher_name")[:top]),
+        ("Week", report.totals_by("week")),
+    ]
+    for title, rows in sections:
+        table = [[title, "Score", "Count"]]
+        table.extend([value, f"{total:g}", count] for value, total, count in rows)
+        _tabulate(table)
         print()
-    else:
-        print("No timetable found.")
-        print(response["error"])
+    trend = [["Reason", f"Last {period} weeks", "Previous", "Change"]]
+    trend.extend(
+        [reason, f"{current:g}", f"{previous:g}", f"{delta:+g}"]
+        for reason, current, previous, delta in report.trend("reason", period, top)
+    )
+    _tabulate(trend)
+    print()
+
+
+def _sync(session, student_id, days=30, overlap=1):
+    """Sync activity, homework, detentions and attendance to the local store."""
+    from store import SyncStore, sync_pupil
+
+    store = SyncStore()
+    try:
+        fetched = sync_pupil(session, store, student_id, days=days, overlap=overlap)
+    finally:
+        store.close()
+    print(f"Synced to {store.path}")
+    for endpoint, count in fetched.items():
+        print(f"{endpoint}: {count} rows fetched")
+
+
+def _changes(
+    session, student_id, endpoints, days=30, sinks=("stdout",), baseline=False
+):
+    """Send new, changed and removed records since the last run to the sinks."""
+    from changes import detect_changes, open_sink
+    from store import SyncStore
 
+    store = SyncStore()
+    outputs = [open_sink(sink) for sink in sinks]
+    try:
+        for endpoint in endpoints:
+            changes = detect_changes(session, store, student_id, endpoint, days=days)
+            if not baseline:
+                for output in outputs:
+                    output.emit(changes)
+            store.apply_changes(changes)
+            counts = {kind: 0 for kind in ("insert", "update", "delete")}
+            for change in changes:
+                counts[change.kind] += 1
+            print(
+                f"{endpoint}: {counts['insert']} new, {counts['update']} changed, {counts['delete']} removed"
+                + (" (baseline recorded)" if baseline else "")
+            )
+    finally:
+        for output in outputs:
+            output.close()
+        store.close()
+
+
+def _serve(session, students, args):
+    """Poll every pupil's endpoints into the local store until interrupted."""
+    from scheduler import Scheduler
+    from store import SyncStore
+
+    store = SyncStore()
+    scheduler = Scheduler(
+        session,
+        store,
+        [student.id for student in students],
+        intervals=dict(args.interval or ()),
+        workers=args.concurrency,
+        jitter=args.jitter,
+        days=args.days,
+        overlap=args.overlap,
+    )
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+    print(f"Serving {len(students)} pupils into {store.path} (Ctrl+C to stop)")
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
+    finally:
+        store.close()
+
+
+def _serve_api(session, students, args):
+    """Serve the local JSON API until interrupted."""
+    from api import QueryAPI
+    from scheduler import Scheduler
+    from store import SyncStore
 
-def _get_students(session_id, all_students):
+    store = SyncStore()
+    scheduler = None
+    if args.poll:
+        scheduler = Scheduler(
+            session,
+            store,
+            [student.id for student in students],
+            intervals=dict(args.interval or ()),
+            days=args.days,
+            overlap=args.overlap,
+        )
+        threading.Thread(target=scheduler.run, daemon=True).start()
+    api = QueryAPI(
+        session,
+        store,
+        host=args.host,
+        port=args.port,
+        intervals=dict(args.interval or ()),
+        scheduler=scheduler,
+        days=args.days,
+        overlap=args.overlap,
+    )
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=api.stop).start())
+    print(f"Serving the ClassCharts API at {api.url} (Ctrl+C to stop)")
+    try:
+        api.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if scheduler is not None:
+            scheduler.stop()
+        store.close()
+
+
+def _download_attachments(session, students, args):
+    """Download every pupil's attachments into the content-addressed store."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from attachments import AttachmentStore, Downloader, list_attachments
+
+    store = AttachmentStore(args.dir)
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            found = executor.map(
+                lambda student: list_attachments(session, student.id, args.days),
+                students,
+            )
+            attachments = [attachment for listed in found for attachment in listed]
+        summary = Downloader(session, store, workers=args.concurrency).download(
+            attachments
+        )
+    finally:
+        store.close()
+    print(
+        f"{len(attachments)} attachments ({summary['files']} distinct files) in {store.root}"
+    )
+    print(
+        f"{summary['downloaded']} downloaded ({summary['bytes'] / 1048576:.1f} MiB), {summary['stored']} already stored, {len(summary['failed'])} failed"
+    )
+    for url, err in summary["failed"]:
+        print(f"Failed: {url}: {err}")
+
+
+def _snapshot(session, students, args):
+    """Fetch the selected endpoints of every pupil in one concurrent pass and
+    save one JSON (or JSON Lines) document per pupil."""
+    from concurrent.futures import ThreadPoolExecutor
+    import json
+
+    def fetch(task):
+        student, endpoint = task
+        query = argparse.Namespace(
+            func=endpoint,
+            days=args.days,
+            display_date="issue_date",
+            date=date.today(),
+            # days are fetched one at a time; the endpoints run concurrently
+            concurrency=1,
+        )
+        with _INSTRUMENTATION.span(f"snapshot.{endpoint}", student_id=student.id):
+            try:
+                return list(_iter_records(session, student.id, query)), None
+            except (SystemExit, Exception) as err:  # pylint: disable=broad-except
+                # one failed endpoint should not lose the rest of the snapshot
+                return None, str(err)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    taken_at = datetime.now().isoformat(timespec="seconds")
+    tasks = [(student, endpoint) for student in students for endpoint in args.endpoints]
+    workers = max(1, min(args.concurrency, session.transport.pool_size))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(fetch, tasks))
+    for index, student in enumerate(students):
+        fetched = results[
+            index * len(args.endpoints) : (index + 1) * len(args.endpoints)
+        ]
+        data = {}
+        errors = {}
+        for endpoint, (records, error) in zip(args.endpoints, fetched):
+            if error is None:
+                data[endpoint] = records
+            else:
+                errors[endpoint] = error
+        header = {
+            "student": student.to_dict(),
+            "taken_at": taken_at,
+            "errors": errors,
+        }
+        path = os.path.join(args.output_dir, f"{student.id}_snapshot.{args.format}")
+        with open(path, "w", encoding="utf-8") as output:
+            if args.format == "json":
+                json.dump({**header, "data": data}, output, default=str)
+            else:
+                output.write(json.dumps(header, default=str) + "\n")
+                for endpoint, records in data.items():
+                    for record in records:
+                        output.write(
+                            json.dumps(
+                                {"endpoint": endpoint, "record": record}, default=str
+                            )
+                            + "\n"
+                        )
+        rows = sum(len(records) for records in data.values())
+        print(f"{student} ({student.id}): {rows} records saved to {path}")
+        for endpoint, error in errors.items():
+            print(f"  {endpoint} failed: {error}")
+
+
+def _interval(value):
+    """Parse an endpoint=seconds serve interval."""
+    from scheduler import DEFAULT_INTERVALS
+
+    endpoint, _, seconds = value.partition("=")
+    if endpoint not in DEFAULT_INTERVALS or not seconds.isdigit():
+        raise argparse.ArgumentTypeError(
+            f"expected <endpoint>=<seconds> with endpoint one of {', '.join(DEFAULT_INTERVALS)}"
+        )
+    return endpoint, int(seconds)
+
+
+def _get_students(session, all_students):
     """Get all students."""
-    url = f"{API_URL}/pupils"
-    header = {
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {session_id}",
-    }
-    response = _make_request("GET", url, header=header)
-    students = []
-    for student in response["data"]:
-        students.append(Student(**student))
+    students = client.get_pupils(session)
     if all_students:
         return students
     if len(students) < 2:
@@ -594,13 +784,308 @@ def _get_students(session_id, all_students):
             f"#{idx}: {student.first_name} {student.last_name} ({student.school_name})"
         )
     input_student = int(input("Enter the number of the pupil you want to view\n"))
-    return Student(**response["data"][input_student - 1])
+    return students[input_student - 1]
+
+
+def _iter_records(session, student_id, args):
+    """Yield the selected subcommand's data as dicts, as each page or day arrives."""
+    from_date = client.since(getattr(args, "days", 30))
+    raw = {
+        "academicreport": client.get_academicreport,
+        "badges": client.get_badges,
+        "behaviour": lambda session, student_id: client.get_behaviour(
+            session, student_id, from_date
+        ),
+        "classes": client.get_classes,
+        "customfields": client.get_customfields,
+    }
+    if args.func == "activity":
+        for activity in client.iter_activity(session, student_id, from_date):
+            yield activity.to_dict()
+    elif args.func == "attendance":
+        attendance = client.get_attendance(session, student_id, from_date)
+        for attendance_date, attendance_session, values in attendance.sessions():
+            yield {
+                "date": attendance_date,
+                "session": attendance_session,
+                **values.to_dict(),
+            }
+    elif args.func == "timetable":
+        for lesson in client.iter_timetable_range(
+            session, student_id, args.date, concurrency=args.concurrency
+        ):
+            yield lesson.to_dict()
+    elif args.func == "announcements":
+        for announcement in client.get_announcements(session, student_id):
+            yield announcement.to_dict()
+    elif args.func == "detentions":
+        for detention in client.get_detentions(session, student_id):
+            yield detention.to_dict()
+    elif args.func == "homework":
+        for homework in client.get_homework(
+            session,
+            student_id,
+            from_date,
+            display_date=getattr(args, "display_date", "issue_date"),
+        ):
+            yield homework.to_dict()
+    elif args.func in raw:
+        data = raw[args.func](session, student_id)
+        if isinstance(data, list):
+            yield from data
+        elif data:
+            yield data
+
+
+def _record_fields(func):
+    """Field names of the records _iter_records yields for a subcommand, or
+    None for the raw endpoints, whose fields depend on the response."""
+    models = {
+        "activity": Activity,
+        "announcements": Announcements,
+        "detentions": Detentions,
+        "homework": Homework,
+        "timetable": Timetable,
+    }
+    if func == "attendance":
+        return ["date", "session", *AttendanceData.__slots__]
+    if func in models:
+        return list(models[func].__slots__)
+    return None
+
+
+def _export(session, student_id, args, output_prefix=""):
+    """Stream the selected subcommand's data to --output in --format."""
+    output = args.output or f"{args.func}.{EXPORTERS[args.format].extension}"
+    if output_prefix and output != "-":
+        output = f"{output_prefix}{os.path.basename(output)}"
+    with open_exporter(args.format, output, _record_fields(args.func)) as exporter:
+        exporter.write_all(_iter_records(session, student_id, args))
+    if output != "-":
+        print(f"{exporter.rows} rows saved to {output}")
+
+
+# subcommand -> runner(session, student_id, args, output_prefix) for one pupil
+_COMMANDS = {
+    "academicreport": lambda session, pupil, args, prefix: _get_academicreport(
+        session, pupil
+    ),
+    "activity": lambda session, pupil, args, prefix: _get_activity(
+        session,
+        pupil,
+        days=args.days,
+        save_csv=args.csv,
+        csv_file=f"{prefix}activity.csv",
+        stream=args.stream,
+    ),
+    "announcements": lambda session, pupil, args, prefix: _get_announcements(
+        session, pupil
+    ),
+    "attendance": lambda session, pupil, args, prefix: _get_attendance(
+        session, pupil, days=args.days
+    ),
+    "badges": lambda session, pupil, args, prefix: _get_badges(session, pupil),
+    "behaviour": lambda session, pupil, args, prefix: _get_behaviour(
+        session, pupil, days=args.days
+    ),
+    "changes": lambda session, pupil, args, prefix: _changes(
+        session,
+        pupil,
+        args.endpoints,
+        days=args.days,
+        sinks=args.sink or ["stdout"],
+        baseline=args.baseline,
+    ),
+    "classes": lambda session, pupil, args, prefix: _get_classes(session, pupil),
+    "customfields": lambda session, pupil, args, prefix: _get_customfields(
+        session, pupil
+    ),
+    "detentions": lambda session, pupil, args, prefix: _get_detentions(
+        session,
+        pupil,
+        save_csv=args.csv,
+        csv_file=f"{prefix}detentions.csv",
+    ),
+    "homework": lambda session, pupil, args, prefix: _get_homework(
+        session,
+        pupil,
+        display_type=args.display_date,
+        days=args.days,
+        index=args.number,
+    ),
+    "report": lambda session, pupil, args, prefix: _get_report(
+        session,
+        [(str(pupil), pupil)],
+        days=args.days,
+        top=args.top,
+        period=args.period,
+        concurrency=args.concurrency,
+    ),
+    "sync": lambda session, pupil, args, prefix: _sync(
+        session, pupil, days=args.days, overlap=args.overlap
+    ),
+    "timetable": lambda session, pupil, args, prefix: _get_timetable(
+        session, pupil, date_required=args.date, concurrency=args.concurrency
+    ),
+}
+
+# subcommands that never answer from cached responses: serve and api poll
+# on their own schedule and changes compares against the live data
+_REFRESH_COMMANDS = ("api", "changes", "serve")
+
+# subcommands run once for the whole account: runner(session, students, args)
+_ACCOUNT_COMMANDS = {
+    "api": _serve_api,
+    "attachments": _download_attachments,
+    "serve": _serve,
+    "snapshot": _snapshot,
+}
+
+
+def _run_command(session, student_id, args, output_prefix=""):
+    """Run the selected subcommand for one pupil."""
+    with _INSTRUMENTATION.span(f"command.{args.func}", student_id=student_id):
+        try:
+            if getattr(args, "format", None):
+                _export(session, student_id, args, output_prefix=output_prefix)
+            else:
+                _COMMANDS[args.func](session, student_id, args, output_prefix)
+        except APIError as err:
+            print(f"ClassCharts request failed: {err}")
+
+
+def _export_pupil(session, student, args):
+    """Run the selected subcommand for one pupil and save its output to a file."""
+    prefix = os.path.join(args.output_dir, f"{student.id}_")
+    output_file = f"{prefix}{args.func}.txt"
+    with open(output_file, "w", encoding="utf-8") as output:
+        _PUPIL_OUTPUT.stream = output
+        try:
+            _run_command(session, student.id, args, output_prefix=prefix)
+        finally:
+            _PUPIL_OUTPUT.stream = None
+    return output_file
+
+
+def _export_all_pupils(session, students, args):
+    """Run the selected subcommand for every pupil on a bounded worker pool."""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stdout = sys.stdout
+    sys.stdout = _PupilStdout(stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+            futures = {
+                executor.submit(_export_pupil, session, student, args): student
+                for student in students
+            }
+            for future in as_completed(futures):
+                student = futures[future]
+                print(f"{student} ({student.id}): saved to {future.result()}")
+    finally:
+        sys.stdout = stdout
+
+
+def _print_profile():
+    """Print the per-phase timing breakdown to stderr."""
+    stdout = sys.stdout
+    sys.stdout = sys.__stderr__
+    try:
+        print()
+        _tabulate(_INSTRUMENTATION.profile())
+    finally:
+        sys.stdout = stdout
+
+
+def _write_metrics(path):
+    """Write the Prometheus request metrics to a file."""
+    with open(path, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(_INSTRUMENTATION.prometheus())
 
 
 def parse_args(args=None):
     """Parse command line arguments."""
     #  pylint: disable=unused-variable
     parser = argparse.ArgumentParser(description="Probe for ClassCharts data")
+    parser.add_argument(
+        "--pool_size",
+        type=int,
+        default=10,
+        help="number of pooled HTTP connections to keep open (default 10)",
+    )
+    parser.add_argument(
+        "--no_keep_alive",
+        action="store_true",
+        help="close the HTTP connection after every request",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="times to retry a failed or throttled request (default 3)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="maximum requests per second across all workers (default unlimited)",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=1,
+        help="requests allowed back to back before --rate applies (default 1)",
+    )
+    parser.add_argument(
+        "--force_login",
+        action="store_true",
+        help="log in again even if a saved session is still fresh",
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="do not read or write the local response cache",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="ignore cached responses but store the fresh ones",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print a per-phase timing breakdown to stderr at exit",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="write Prometheus request metrics to this file at exit",
+    )
+    parser.add_argument(
+        "--html_workers",
+        type=int,
+        default=1,
+        help="processes converting uncached HTML descriptions (default 1)",
+    )
+    parser.add_argument(
+        "--all_pupils",
+        action="store_true",
+        help="run the command for every pupil and save the output per pupil",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="number of pupils to export at once with --all_pupils (default 4)",
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=".",
+        help="directory for --all_pupils output files (default current directory)",
+    )
     subparsers = parser.add_subparsers(dest="func", help="description")
     # create the parser for the "academicreport" command
     parser_academicreport = subparsers.add_parser(
@@ -612,10 +1097,86 @@ def parse_args(args=None):
     )
     parser_activity.add_argument("--days", type=int, default=30, required=False)
     parser_activity.add_argument("--csv", type=bool, required=False)
+    parser_activity.add_argument(
+        "--stream",
+        action="store_true",
+        help=f"print rows as they arrive, sizing columns from the first "
+        f"{STREAM_SAMPLE} rows",
+    )
     # create the parser for the "annoucements" command
     parser_announcements = subparsers.add_parser(
         "announcements", help="get announcements"
     )
+    # create the parser for the "api" command
+    parser_api = subparsers.add_parser(
+        "api", help="serve pupils' data as a local JSON API"
+    )
+    parser_api.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        required=False,
+        help="address to listen on (default 127.0.0.1)",
+    )
+    parser_api.add_argument(
+        "--port",
+        type=int,
+        default=8080,
+        required=False,
+        help="port to listen on (default 8080)",
+    )
+    parser_api.add_argument(
+        "--poll",
+        action="store_true",
+        help="keep the data current with the serve scheduler instead of on request",
+    )
+    parser_api.add_argument(
+        "--interval",
+        type=_interval,
+        action="append",
+        required=False,
+        help="seconds before an endpoint is synced again, e.g. activity=300",
+    )
+    parser_api.add_argument(
+        "--days",
+        type=int,
+        default=30,
+        required=False,
+        help="days to fetch on the first sync of a pupil (default 30)",
+    )
+    parser_api.add_argument(
+        "--overlap",
+        type=int,
+        default=1,
+        required=False,
+        help="days before the last sync to fetch again (default 1)",
+    )
+    # create the parser for the "attachments" command
+    parser_attachments = subparsers.add_parser(
+        "attachments",
+        help="download every pupil's announcement and homework attachments",
+    )
+    parser_attachments.add_argument(
+        "--days",
+        type=int,
+        default=30,
+        required=False,
+        help="include homework issued in the last n days (default 30)",
+    )
+    parser_attachments.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        required=False,
+        help="number of files to download at once (default 4)",
+    )
+    parser_attachments.add_argument(
+        "--dir",
+        type=str,
+        default=None,
+        required=False,
+        help="directory to store attachments in (default <data_dir>/attachments)",
+    )
     # create the parser for the "attendance" command
     parser_attendance = subparsers.add_parser("attendance", help="get attendance")
     parser_attendance.add_argument("--days", type=int, default=30, required=False)
@@ -626,6 +1187,38 @@ def parse_args(args=None):
         "behaviour", help="get behaviour for the last n days (default 30)"
     )
     parser_behaviour.add_argument("--days", type=int, default=30, required=False)
+    # create the parser for the "changes" command
+    parser_changes = subparsers.add_parser(
+        "changes",
+        help="report new, changed and removed homework, detentions and announcements",
+    )
+    parser_changes.add_argument(
+        "--endpoints",
+        nargs="+",
+        choices=CHANGE_ENDPOINTS,
+        default=list(CHANGE_ENDPOINTS),
+        required=False,
+        help="endpoints to check (default all)",
+    )
+    parser_changes.add_argument(
+        "--days",
+        type=int,
+        default=30,
+        required=False,
+        help="days of homework to check (default 30)",
+    )
+    parser_changes.add_argument(
+        "--sink",
+        type=str,
+        action="append",
+        required=False,
+        help="stdout, jsonl:<path> or webhook:<url>; repeat for several (default stdout)",
+    )
+    parser_changes.add_argument(
+        "--baseline",
+        action="store_true",
+        help="record the current data without reporting it as changes",
+    )
     # create the parser for the "classes" command
     parser_classes = subparsers.add_parser("classes", help="get classes")
     # create the parser for the "customfields" command
@@ -647,6 +1240,122 @@ def parse_args(args=None):
         choices=["issue_date", "due_date"],
     )
     parser_homework.add_argument("--number", type=int, required=False)
+    # create the parser for the "report" command
+    parser_report = subparsers.add_parser(
+        "report", help="activity score breakdowns for the last n days (default 365)"
+    )
+    parser_report.add_argument("--days", type=int, default=365, required=False)
+    parser_report.add_argument(
+        "--top",
+        type=int,
+        default=5,
+        required=False,
+        help="number of reasons, lessons and teachers to list (default 5)",
+    )
+    parser_report.add_argument(
+        "--period",
+        type=int,
+        default=4,
+        required=False,
+        help="weeks per period when comparing trends (default 4)",
+    )
+    parser_report.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        required=False,
+        help="number of pupils to fetch activity for at once (default 4)",
+    )
+    parser_report.add_argument(
+        "--combined",
+        action="store_true",
+        help="aggregate every pupil on the account into one report",
+    )
+    # create the parser for the "serve" command
+    parser_serve = subparsers.add_parser(
+        "serve", help="keep polling every pupil's endpoints into the local store"
+    )
+    parser_serve.add_argument(
+        "--interval",
+        type=_interval,
+        action="append",
+        required=False,
+        help="seconds between polls of an endpoint, e.g. activity=300 (0 disables it)",
+    )
+    parser_serve.add_argument(
+        "--concurrency",
+        type=int,
+        default=2,
+        required=False,
+        help="number of endpoints to sync at once (default 2)",
+    )
+    parser_serve.add_argument(
+        "--jitter",
+        type=float,
+        default=0.1,
+        required=False,
+        help="fraction poll intervals vary by (default 0.1)",
+    )
+    parser_serve.add_argument(
+        "--days",
+        type=int,
+        default=30,
+        required=False,
+        help="days to fetch on the first sync of a pupil (default 30)",
+    )
+    parser_serve.add_argument(
+        "--overlap",
+        type=int,
+        default=1,
+        required=False,
+        help="days before the last sync to fetch again (default 1)",
+    )
+    # create the parser for the "snapshot" command
+    parser_snapshot = subparsers.add_parser(
+        "snapshot",
+        help="fetch every endpoint at once and save one JSON document per pupil",
+    )
+    parser_snapshot.add_argument(
+        "--endpoints",
+        nargs="+",
+        choices=SNAPSHOT_ENDPOINTS,
+        default=list(SNAPSHOT_ENDPOINTS),
+        required=False,
+        help="endpoints to include (default all)",
+    )
+    parser_snapshot.add_argument("--days", type=int, default=30, required=False)
+    parser_snapshot.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        required=False,
+        help="number of endpoints to fetch at once, at most --pool_size (default 8)",
+    )
+    parser_snapshot.add_argument(
+        "--format",
+        choices=["json", "jsonl"],
+        default="json",
+        required=False,
+        help="one JSON document, or a header line then one line per record",
+    )
+    # create the parser for the "sync" command
+    parser_sync = subparsers.add_parser(
+        "sync", help="sync new activity, homework, detentions and attendance"
+    )
+    parser_sync.add_argument(
+        "--days",
+        type=int,
+        default=30,
+        required=False,
+        help="days to fetch on the first sync of a pupil (default 30)",
+    )
+    parser_sync.add_argument(
+        "--overlap",
+        type=int,
+        default=1,
+        required=False,
+        help="days before the last sync to fetch again (default 1)",
+    )
     # create the parser for the "timetable" command
     parser_timetable = subparsers.add_parser("timetable", help="get timetable")
     parser_timetable.add_argument(
@@ -655,33 +1364,100 @@ def parse_args(args=None):
         default=date.today(),
         required=False,
     )
+    parser_timetable.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        required=False,
+        help="number of timetable days to fetch at once (default 1)",
+    )
+    # add the export options to every data command
+    for name, subparser in subparsers.choices.items():
+        if name in (
+            "api",
+            "attachments",
+            "changes",
+            "report",
+            "serve",
+            "snapshot",
+            "sync",
+        ):
+            continue
+        subparser.add_argument(
+            "--format",
+            choices=sorted(EXPORTERS),
+            required=False,
+            help="stream the data to a file in this format instead of printing it",
+        )
+        subparser.add_argument(
+            "--output",
+            type=str,
+            required=False,
+            help="file to export to, or - for stdout (default <command>.<format>)",
+        )
     # parse the args
     return parser.parse_args(args)
 
 
 def main():
     """ClassCharts API main function."""
+    global _TEXT_CACHE, _HTML_WORKERS  # pylint: disable=global-statement
     all_students = False
     args = parse_args()
+    if getattr(args, "output", None) == "-":
+        # keep stdout for the exported rows
+        sys.stdout = sys.stderr
 
-    cs = Session()
-    print(f"Attempting to log in as {cs.username}...")
-    cs_session = cs.login()
+    serve = args.func in _ACCOUNT_COMMANDS
+    cache = None
+    if not args.no_cache:
+        from cache import ResponseCache, TextCache
+
+        # these must see current data, so they always refresh the cache
+        cache = ResponseCache(
+            namespace=os.getenv("email", ""),
+            refresh=args.refresh or args.func in _REFRESH_COMMANDS,
+        )
+        _TEXT_CACHE = TextCache()
+    cs = Session(
+        pool_size=args.pool_size,
+        keep_alive=not args.no_keep_alive,
+        cache=cache,
+        token_file=TOKEN_FILE,
+        policy=RequestPolicy(retries=args.retries, rate=args.rate, burst=args.burst),
+        instrumentation=_INSTRUMENTATION,
+    )
+    if args.profile:
+        atexit.register(_print_profile)
+    if args.metrics:
+        atexit.register(_write_metrics, args.metrics)
+    _HTML_WORKERS = args.html_workers
+    cs_session = None if args.force_login else cs.resume()
+    if cs_session:
+        print(f"Resumed saved session for {cs.username}.")
+    else:
+        print(f"Attempting to log in as {cs.username}...")
+        cs_session = cs.login()
 
     if cs_session["success"] == 1:
         print(
-            f"Hello {cs_session['data']['name']}! You have successfully logged in to ClassCharts."
+            f"Hello {cs_session['data'].get('name', cs.username)}! You have successfully logged in to ClassCharts."
         )
         print(f"Your session ID is {cs.session_id}")
         print()
+        cs.tokens.start()
     else:
         print("Login failed. Please check your credentials and try again.")
         return
 
-    if args.func is None:
+    combined = getattr(args, "combined", False)
+    # snapshot covers the selected pupil unless --all_pupils is given
+    if args.func is None or args.all_pupils or combined:
+        all_students = True
+    elif serve and args.func != "snapshot":
         all_students = True
 
-    students = _get_students(cs.session_id, all_students)
+    students = _get_students(cs, all_students)
 
     if args.func is None:
         print("Listing all pupils for this account...")
@@ -702,37 +1478,27 @@ def main():
                     )
                     print()
                 return
+    if combined:
+        with _INSTRUMENTATION.span("command.report"):
+            _get_report(
+                cs,
+                [(str(student), student.id) for student in students],
+                days=args.days,
+                top=args.top,
+                period=args.period,
+                concurrency=args.concurrency,
+            )
+        return
+    if serve:
+        _ACCOUNT_COMMANDS[args.func](cs, students if all_students else [students], args)
+        return
+    if args.all_pupils:
+        _export_all_pupils(cs, students, args)
+        return
     print(f"Selected pupil: {students}, ID: {students.id} ({students.school_name})")
     print()
 
-    if args.func == "academicreport":
-        _get_academicreport(cs.session_id, students.id)
-    if args.func == "activity":
-        _get_activity(cs.session_id, students.id, days=args.days, save_csv=args.csv)
-    if args.func == "announcements":
-        _get_announcements(cs.session_id, students.id)
-    if args.func == "attendance":
-        _get_attendance(cs.session_id, students.id, days=args.days)
-    if args.func == "badges":
-        _get_badges(cs.session_id, students.id)
-    if args.func == "behaviour":
-        _get_behaviour(cs.session_id, students.id, days=args.days)
-    if args.func == "classes":
-        _get_classes(cs.session_id, students.id)
-    if args.func == "customfields":
-        _get_customfields(cs.session_id, students.id)
-    if args.func == "detentions":
-        _get_detentions(cs.session_id, students.id, save_csv=args.csv)
-    if args.func == "homework":
-        _get_homework(
-            cs.session_id,
-            students.id,
-            display_type=args.display_date,
-            days=args.days,
-            index=args.number,
-        )
-    if args.func == "timetable":
-        _get_timetable(cs.session_id, students.id, date_required=args.date)
+    _run_command(cs, students.id, args)
 
 
 if __name__ == "__main__":
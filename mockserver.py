@@ -0,0 +1,421 @@
+"""
+Local stand-in for the ClassCharts parent API
+
+Serves synthetic (or recorded) responses for every endpoint main.py uses,
+with configurable latency and error injection, so the client can be run and
+benchmarked without touching classcharts.com.
+
+Usage:
+    python mockserver.py [--port 8765] [--latency 0.05] [--error_rate 0.01]
+    api_url=http://127.0.0.1:8765/apiv2parent python main.py activity
+
+Recorded responses:
+    --fixtures DIR serves DIR/<endpoint>.json (e.g. pupils.json) in place of
+    the synthetic response for that endpoint.
+"""
+
+import argparse
+from datetime import date, timedelta
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+# pylint: disable=too-many-instance-attributes
+
+REASONS = ("Good work", "Homework", "Effort", "Disruption", "Late", "Kindness")
+SUBJECTS = ("Maths", "English", "Science", "History", "Art")
+
+
+class MockServer:
+    """Threaded mock ClassCharts API server.
+    Data sizes, latency (seconds per request) and error injection (a fraction
+    of requests answered with error_status) can be changed while running."""
+
+    def __init__(self, port=0, **kwargs):
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.error_status = 502
+        self.pupils = 2
+        self.activity_rows = 500
+        self.page_size = 50
+        self.timetable_days = 10
+        self.homeworks = 20
+        self.attendance_days = 30
+        self.attachment_size = 0
+        self.fixtures = {}
+        self.requests = {}
+        self._lock = threading.Lock()
+        self.configure(**kwargs)
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """api_url to point the client at."""
+        return f"http://127.0.0.1:{self._server.server_port}/apiv2parent"
+
+    def configure(self, **kwargs):
+        """Change sizes, latency or error injection."""
+        for name, value in kwargs.items():
+            if not hasattr(self, name):
+                raise TypeError(f"unknown mock server setting: {name}")
+            setattr(self, name, value)
+
+    def load_fixtures(self, directory):
+        """Serve DIR/<endpoint>.json instead of synthetic data."""
+        for file_name in os.listdir(directory):
+            if file_name.endswith(".json"):
+                with open(os.path.join(directory, file_name), encoding="utf-8") as f:
+                    self.fixtures[file_name[:-5]] = json.load(f)
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve in the current thread until interrupted."""
+        self._server.serve_forever()
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self):
+        """Forget the per-endpoint request counts."""
+        with self._lock:
+            self.requests = {}
+
+    def count(self, endpoint):
+        """Record a request to an endpoint."""
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def file_url(self, name):
+        """URL an attachment is served at."""
+        return f"http://127.0.0.1:{self._server.server_port}/files/{name}"
+
+    def file_body(self, name):
+        """Content of an attachment: attachment_size bytes derived from name."""
+        seed = hashlib.sha256(name.encode()).digest()
+        return (seed * (self.attachment_size // len(seed) + 1))[: self.attachment_size]
+
+    def respond(self, endpoint, student_id, query):
+        """Return the JSON body for an endpoint."""
+        if endpoint in self.fixtures:
+            return self.fixtures[endpoint]
+        builder = getattr(self, f"_{endpoint}", None)
+        if builder is None:
+            return {"success": 1, "data": [], "meta": {}, "error": ""}
+        return builder(student_id, query)
+
+    def _login(self, *_):
+        return {
+            "success": 1,
+            "data": {"name": "Mock Parent"},
+            "meta": {"session_id": f"mock-{random.getrandbits(32):08x}"},
+        }
+
+    _ping = _login
+
+    def _pupils(self, *_):
+        return _ok(
+            [
+                {
+                    "id": pupil,
+                    "first_name": f"Pupil{pupil}",
+                    "last_name": "Mock",
+                    "school_name": "Mock School",
+                    "display_homework": 1,
+                    "display_detentions": 1,
+                }
+                for pupil in range(1, self.pupils + 1)
+            ]
+        )
+
+    def _activity(self, _, query):
+        last_id = int(query.get("last_id", self.activity_rows + 1))
+        first = min(last_id - 1, self.activity_rows)
+        start = date.today()
+        rows = []
+        for activity_id in range(first, max(0, first - self.page_size), -1):
+            positive = activity_id % 3 != 0
+            rows.append(
+                {
+                    "id": activity_id,
+                    "timestamp": f"{start - timedelta(days=activity_id // 4)} 10:00",
+                    "type": "behaviour",
+                    "polarity": "positive" if positive else "negative",
+                    "reason": REASONS[activity_id % len(REASONS)],
+                    "score": 1 if positive else -1,
+                    "lesson_name": SUBJECTS[activity_id % len(SUBJECTS)],
+                    "teacher_name": f"Teacher {activity_id % 7}",
+                    "room_name": f"Room {activity_id % 12}",
+                    "note": "",
+                }
+            )
+        return _ok(rows)
+
+    def _homeworks(self, *_):
+        return _ok(
+            [
+                {
+                    "id": homework_id,
+                    "title": f"Homework {homework_id}",
+                    "subject": SUBJECTS[homework_id % len(SUBJECTS)],
+                    "lesson": f"Set {homework_id % 3}",
+                    "teacher": f"Teacher {homework_id % 7}",
+                    "homework_type": "Homework",
+                    "description": f"<p>Complete <b>exercise {homework_id}</b></p>",
+                    "issue_date": str(date.today() - timedelta(days=homework_id)),
+                    "due_date": str(date.today() + timedelta(days=homework_id % 7)),
+                    "completion_time_value": "30",
+                    "completion_time_unit": "minutes",
+                    "status": {"state": "completed" if homework_id % 2 else None},
+                    "validated_attachments": (
+                        [
+                            {
+                                "id": homework_id,
+                                "file_name": f"worksheet-{homework_id}.pdf",
+                                "validated_file": self.file_url(
+                                    f"worksheet-{homework_id}.pdf"
+                                ),
+                            }
+                        ]
+                        if self.attachment_size and homework_id % 5 == 0
+                        else []
+                    ),
+                }
+                for homework_id in range(1, self.homeworks + 1)
+            ],
+            this_week_due_count=1,
+            this_week_completed_count=1,
+            this_week_outstanding_count=0,
+        )
+
+    def _attendance(self, *_):
+        days = [
+            str(date.today() - timedelta(days=day))
+            for day in range(self.attendance_days, 0, -1)
+        ]
+        data = {
+            day: {
+                "AM": {"code": "/", "status": "present", "late_minutes": 0},
+                "PM": (
+                    {"code": "L", "status": "late", "late_minutes": 5}
+                    if index % 5 == 0
+                    else {"code": "\\", "status": "present", "late_minutes": 0}
+                ),
+            }
+            for index, day in enumerate(days)
+        }
+        return _ok(
+            data,
+            dates=days,
+            sessions=["AM", "PM"],
+            percentage="98",
+            percentage_singe_august="97",
+            start_date=f"{days[0]}T00:00:00" if days else "",
+            end_date=f"{days[-1]}T00:00:00" if days else "",
+        )
+
+    def _timetable(self, _, query):
+        day = query.get("date", str(date.today()))[:10]
+        first = date.today()
+        return _ok(
+            [
+                {
+                    "date": day,
+                    "lesson_name": f"{SUBJECTS[period % len(SUBJECTS)]} {period}",
+                    "subject_name": SUBJECTS[period % len(SUBJECTS)],
+                    "teacher_name": f"Teacher {period}",
+                    "period_number": str(period),
+                    "room_name": f"Room {period}",
+                }
+                for period in range(1, 6)
+            ],
+            timetable_dates=[
+                str(first + timedelta(days=offset))
+                for offset in range(self.timetable_days)
+            ],
+            periods=[
+                {
+                    "number": str(period),
+                    "start_time": f"{8 + period:02d}:00",
+                    "end_time": f"{8 + period:02d}:50",
+                }
+                for period in range(1, 6)
+            ],
+        )
+
+    def _detentions(self, *_):
+        return _ok(
+            [
+                {
+                    "id": 1,
+                    "date": str(date.today()),
+                    "time": "15:30",
+                    "length": 30,
+                    "location": "Hall",
+                    "notes": "Mock detention",
+                    "lesson": {"name": "Set 1", "subject": {"name": "Maths"}},
+                    "teacher": {"title": "Mx", "first_name": "A", "last_name": "B"},
+                    "detention_type": {"name": "After school"},
+                }
+            ]
+        )
+
+    def _announcements(self, student_id, _):
+        # the newsletter is shared by every pupil, the letters are per pupil
+        names = {1: "newsletter.pdf", 2: f"letter-{student_id}.pdf"}
+        return _ok(
+            [
+                {
+                    "id": announcement_id,
+                    "title": f"Announcement {announcement_id}",
+                    "description": "<div>Mock <i>announcement</i> body</div>",
+                    "teacher_name": "Head Teacher",
+                    "timestamp": str(date.today()),
+                    "attachments": (
+                        [
+                            {
+                                "filename": names[announcement_id],
+                                "url": self.file_url(names[announcement_id]),
+                            }
+                        ]
+                        if self.attachment_size and announcement_id in names
+                        else []
+                    ),
+                }
+                for announcement_id in range(1, 4)
+            ]
+        )
+
+
+def _ok(data, **meta):
+    """Wrap data in a successful ClassCharts response."""
+    return {"success": 1, "data": data, "meta": meta, "error": ""}
+
+
+def _handler(mock):
+    """Build a request handler class bound to a MockServer."""
+
+    class Handler(BaseHTTPRequestHandler):
+        """Mock ClassCharts request handler."""
+
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):  # pylint: disable=arguments-differ
+            pass
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Answer a GET request."""
+            if self.path.startswith("/files/"):
+                self._file(self.path[len("/files/") :])
+                return
+            self._answer()
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            """Answer a POST request (login and ping)."""
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._answer()
+
+        def _answer(self):
+            url = urlparse(self.path)
+            parts = [part for part in url.path.split("/") if part]
+            endpoint = parts[1] if len(parts) > 1 else ""
+            student_id = parts[2] if len(parts) > 2 else None
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            mock.count(endpoint)
+            if mock.latency:
+                time.sleep(mock.latency)
+            if mock.error_rate and random.random() < mock.error_rate:
+                self._send({"success": 0, "error": "injected"}, mock.error_status)
+                return
+            self._send(mock.respond(endpoint, student_id, query))
+
+        def _file(self, name):
+            """Serve an attachment with an ETag, honouring a bytes=N- Range
+            header unless an If-Range validator no longer matches."""
+            mock.count("files")
+            if mock.latency:
+                time.sleep(mock.latency)
+            body = mock.file_body(name)
+            etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+            start = 0
+            range_header = self.headers.get("Range", "")
+            if self.headers.get("If-Range", etag) != etag:
+                range_header = ""
+            if range_header.startswith("bytes=") and range_header.endswith("-"):
+                start = int(range_header[len("bytes=") : -1])
+                if start >= len(body):
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(body)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header(
+                    "Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}"
+                )
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body) - start))
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+            self.wfile.write(body[start:])
+
+        def _send(self, body, status=200):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+
+def main():
+    """Run the mock server in the foreground."""
+    parser = argparse.ArgumentParser(description="Mock ClassCharts API server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--pupils", type=int, default=2)
+    parser.add_argument("--activity_rows", type=int, default=500)
+    parser.add_argument("--timetable_days", type=int, default=10)
+    parser.add_argument("--attachment_size", type=int, default=0)
+    parser.add_argument("--fixtures", type=str, required=False)
+    args = parser.parse_args()
+    mock = MockServer(
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        pupils=args.pupils,
+        activity_rows=args.activity_rows,
+        timetable_days=args.timetable_days,
+        attachment_size=args.attachment_size,
+    )
+    if args.fixtures:
+        mock.load_fixtures(args.fixtures)
+    print(f"Serving mock ClassCharts API at {mock.url}")
+    try:
+        mock.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
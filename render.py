@@ -0,0 +1,105 @@
+"""Plain-text table rendering."""
+
+from itertools import zip_longest
+import sys
+
+# columns are left aligned and followed by two spaces, as _tabulate always did
+SEPARATOR = "  "
+
+
+class TableWriter:
+    """Writes rows as aligned text columns through one buffered writer.
+    Each cell is converted to text once, each line is built with a single
+    format call and lines go to the stream in chunks of about buffer_size
+    characters.
+
+    Column widths are taken from `widths` when given, so rows stream out
+    straight away; from the first `sample` rows, which are held back until
+    the sample is complete; or, by default, from every row, printed on
+    close(). A cell wider than its fixed or sampled column pushes the rest of
+    its line to the right rather than being cut."""
+
+    def __init__(self, stream=None, widths=None, sample=None, buffer_size=65536):
+        self.stream = stream or sys.stdout
+        self.widths = list(widths) if widths else None
+        self.sample = sample
+        self.buffer_size = buffer_size
+        self.rows = 0
+        self._template = None
+        self._pending = []
+        self._chunk = []
+        self._chunk_size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, row):
+        """Add one row (any iterable of cells)."""
+        cells = [str(cell) for cell in row]
+        self.rows += 1
+        if self.widths is None:
+            self._pending.append(cells)
+            if self.sample is not None and len(self._pending) >= self.sample:
+                self._fix_widths()
+            return
+        self._line(cells)
+
+    def write_all(self, rows):
+        """Add every row of an iterable as it is produced."""
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """Write the buffered lines to the stream."""
+        if self._chunk:
+            self.stream.write("".join(self._chunk))
+            self._chunk = []
+            self._chunk_size = 0
+
+    def close(self):
+        """Print any rows still waiting for column widths and flush."""
+        if self.widths is None:
+            self._fix_widths()
+        self.flush()
+
+    def _fix_widths(self):
+        """Size the columns from the held-back rows, then print them."""
+        pending, self._pending = self._pending, []
+        self.widths = [
+            max(map(len, column)) for column in zip_longest(*pending, fillvalue="")
+        ]
+        for cells in pending:
+            self._line(cells)
+
+    def _line(self, cells):
+        """Format one row and add it to the output buffer."""
+        if len(cells) == len(self.widths):
+            if self._template is None:
+                self._template = (
+                    "".join(f"{{:<{width}}}{SEPARATOR}" for width in self.widths) + "\n"
+                )
+            line = self._template.format(*cells)
+        else:
+            # cells beyond the known columns are written unpadded
+            widths = self.widths + [0] * (len(cells) - len(self.widths))
+            line = (
+                "".join(
+                    cell.ljust(width) + SEPARATOR for cell, width in zip(cells, widths)
+                )
+                + "\n"
+            )
+        self._chunk.append(line)
+        self._chunk_size += len(line)
+        if self._chunk_size >= self.buffer_size:
+            self.flush()
+
+
+def tabulate(rows, stream=None, widths=None, sample=None):
+    """Write rows (a list of lists, or any iterable of rows) as a text table.
+    Returns the number of rows written."""
+    with TableWriter(stream, widths=widths, sample=sample) as writer:
+        writer.write_all(rows)
+    return writer.rows
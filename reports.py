@@ -0,0 +1,153 @@
+"""ClassCharts activity aggregation reports."""
+
+from array import array
+from datetime import date
+
+from classcharts import ActivityTable
+
+try:
+    import numpy
+except ImportError:  # numpy is optional; group-bys fall back to pure Python
+    numpy = None
+
+
+def _group_sum(codes, weights, size):
+    """Sum weights per group code (a bincount), vectorised when numpy is there."""
+    if numpy is not None and len(codes):
+        return numpy.bincount(
+            numpy.frombuffer(codes, dtype=numpy.uint32),
+            weights=numpy.frombuffer(weights, dtype=numpy.float64),
+            minlength=size,
+        ).tolist()
+    totals = [0.0] * size
+    for code, weight in zip(codes, weights):
+        totals[code] += weight
+    return totals
+
+
+def _group_count(codes, size):
+    """Count rows per group code."""
+    if numpy is not None and len(codes):
+        return numpy.bincount(
+            numpy.frombuffer(codes, dtype=numpy.uint32), minlength=size
+        ).tolist()
+    counts = [0] * size
+    for code in codes:
+        counts[code] += 1
+    return counts
+
+
+class ActivityReport:
+    """Activity score aggregations across one or more pupils.
+    Activity rows from every pupil share one ActivityTable; pupil and ISO week
+    are extra dictionary-encoded columns, so every breakdown is a group-by
+    over integer codes and the score column."""
+
+    def __init__(self):
+        self.table = ActivityTable()
+        self.pupils = []
+        self.pupil_codes = array("I")
+        self.weeks = []
+        self.week_codes = array("I")
+        self._week_lookup = {}
+
+    def add(self, pupil, activities):
+        """Add a pupil's Activity models (any iterable, e.g. iter_activity)."""
+        activities = list(activities)
+        if pupil not in self.pupils:
+            self.pupils.append(pupil)
+        self.table.extend(activities)
+        self.pupil_codes.extend([self.pupils.index(pupil)] * len(activities))
+        day_weeks = {}
+        for activity in activities:
+            day = (activity.timestamp or "")[:10]
+            code = day_weeks.get(day)
+            if code is None:
+                code = day_weeks[day] = self._week_code(day)
+            self.week_codes.append(code)
+
+    def __len__(self):
+        return len(self.table)
+
+    def totals_by(self, field):
+        """Return [(value, score total, count)] for a field, highest score first.
+        field is any categorical activity column, "pupil" or "week"."""
+        codes, categories = self._codes(field)
+        scores = self.table.column("score")
+        totals = _group_sum(codes, scores, len(categories))
+        counts = _group_count(codes, len(categories))
+        rows = [
+            (category, totals[code], counts[code])
+            for code, category in enumerate(categories)
+            if counts[code]
+        ]
+        if field == "week":
+            return sorted(rows, key=lambda row: str(row[0]))
+        return sorted(rows, key=lambda row: row[1], reverse=True)
+
+    def top(self, field="reason", number=5):
+        """Return the number most frequent values of a field."""
+        rows = self.totals_by(field)
+        return sorted(rows, key=lambda row: row[2], reverse=True)[:number]
+
+    def trend(self, field="reason", period_weeks=4, number=5):
+        """Compare score totals of the latest period_weeks with the period before.
+        Returns [(value, current, previous, delta)], largest change first."""
+        codes, categories = self._codes(field)
+        known = [week for week in self.weeks if week != "unknown"]
+        if not known:
+            return []
+        latest = max(known)
+        # period 0 is the latest period_weeks weeks, period 1 the ones before
+        week_period = [2] * len(self.weeks)
+        for week_code, week in enumerate(self.weeks):
+            weeks_back = _weeks_between(week, latest)
+            if weeks_back is not None:
+                week_period[week_code] = min(2, weeks_back // period_weeks)
+        size = len(categories)
+        combined = array(
+            "I",
+            (
+                week_period[week_code] * size + code
+                for week_code, code in zip(self.week_codes, codes)
+            ),
+        )
+        totals = _group_sum(combined, self.table.column("score"), size * 3)
+        rows = []
+        for code, category in enumerate(categories):
+            current, previous = totals[code], totals[size + code]
+            if current or previous:
+                rows.append((category, current, previous, current - previous))
+        rows.sort(key=lambda row: abs(row[3]), reverse=True)
+        return rows[:number]
+
+    def _codes(self, field):
+        """Return (codes, categories) for a field."""
+        if field == "pupil":
+            return self.pupil_codes, self.pupils
+        if field == "week":
+            return self.week_codes, self.weeks
+        return self.table.codes(field)
+
+    def _week_code(self, day):
+        """Return the code of the ISO week ("2024-W05") containing a date."""
+        try:
+            year, week, _ = date.fromisoformat(day).isocalendar()
+            label = f"{year}-W{week:02d}"
+        except ValueError:
+            label = "unknown"
+        code = self._week_lookup.get(label)
+        if code is None:
+            code = self._week_lookup[label] = len(self.weeks)
+            self.weeks.append(label)
+        return code
+
+
+def _weeks_between(week, latest):
+    """Whole weeks from an ISO week label back to the latest one."""
+    try:
+        start = date.fromisocalendar(int(week[:4]), int(week[6:]), 1)
+        end = date.fromisocalendar(int(latest[:4]), int(latest[6:]), 1)
+    except ValueError:
+        return None
+    return (end - start).days // 7
@@ -0,0 +1,138 @@
+"""ClassCharts polling scheduler for serve mode."""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import heapq
+import random
+import threading
+import time
+
+from store import sync_endpoint
+
+# seconds between polls of each endpoint, per pupil
+DEFAULT_INTERVALS = {
+    "activity": 300,
+    "announcements": 3600,
+    "attendance": 3600,
+    "detentions": 3600,
+    "homework": 1800,
+    "timetable": 86400,
+}
+
+
+class Job:
+    """One pupil's endpoint polled every interval seconds."""
+
+    __slots__ = ("next_run", "student_id", "endpoint", "interval", "failures")
+
+    def __init__(self, student_id, endpoint, interval, next_run):
+        self.student_id = student_id
+        self.endpoint = endpoint
+        self.interval = interval
+        self.next_run = next_run
+        self.failures = 0
+
+    def __lt__(self, other):
+        return self.next_run < other.next_run
+
+    def __str__(self):
+        return f"{self.student_id} {self.endpoint}"
+
+
+class Scheduler:
+    """Polls every endpoint of every pupil on its own interval into a SyncStore.
+    Intervals are jittered by +/- jitter (a fraction) so polls spread out
+    instead of lining up, first polls are staggered over `stagger` seconds,
+    and at most `workers` syncs run at once. A failed sync is retried after
+    an exponential backoff capped at the endpoint's interval."""
+
+    def __init__(
+        self,
+        session,
+        store,
+        pupils,
+        intervals=None,
+        workers=2,
+        jitter=0.1,
+        stagger=10,
+        days=30,
+        overlap=1,
+    ):
+        self.session = session
+        self.store = store
+        self.intervals = {**DEFAULT_INTERVALS, **(intervals or {})}
+        self.workers = max(1, workers)
+        self.jitter = jitter
+        self.days = days
+        self.overlap = overlap
+        self._jobs = []
+        self._changed = threading.Condition()
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._stopped = False
+        now = time.monotonic()
+        for student_id in pupils:
+            for endpoint, interval in self.intervals.items():
+                if interval:
+                    job = Job(
+                        student_id, endpoint, interval, now + random.uniform(0, stagger)
+                    )
+                    heapq.heappush(self._jobs, job)
+
+    def run(self):
+        """Poll until stop() is called."""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                job = self._next_job()
+                if job is None:
+                    break
+                self._slots.acquire()
+                executor.submit(self._run_job, job)
+
+    def stop(self):
+        """Stop scheduling; syncs already running are allowed to finish."""
+        with self._changed:
+            self._stopped = True
+            self._changed.notify_all()
+
+    def _next_job(self):
+        """Wait for the earliest job to fall due and take it off the queue."""
+        with self._changed:
+            while not self._stopped:
+                wait = self._jobs[0].next_run - time.monotonic() if self._jobs else None
+                if wait is not None and wait <= 0:
+                    return heapq.heappop(self._jobs)
+                self._changed.wait(wait)
+            return None
+
+    def _run_job(self, job):
+        """Sync one job and put it back on the queue."""
+        try:
+            rows = sync_endpoint(
+                self.session,
+                self.store,
+                job.student_id,
+                job.endpoint,
+                self.days,
+                self.overlap,
+            )
+        except (SystemExit, Exception) as err:  # pylint: disable=broad-except
+            # a daemon keeps polling whatever one sync raises
+            job.failures += 1
+            delay = min(job.interval, 30 * 2**job.failures)
+            _log(f"{job}: failed ({err}), retrying in {delay:.0f}s")
+        else:
+            job.failures = 0
+            delay = job.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            if rows:
+                _log(f"{job}: {rows} rows synced")
+        finally:
+            self._slots.release()
+        with self._changed:
+            job.next_run = time.monotonic() + delay
+            heapq.heappush(self._jobs, job)
+            self._changed.notify_all()
+
+
+def _log(message):
+    """Print a timestamped log line."""
+    print(f"{datetime.now():%Y-%m-%d %H:%M:%S} {message}", flush=True)
@@ -0,0 +1,309 @@
+"""ClassCharts local sync store."""
+
+from datetime import date, timedelta
+import json
+import os
+import sqlite3
+import threading
+
+import client
+
+DATA_DIR = os.getenv(
+    "data_dir", os.path.join(os.path.expanduser("~"), ".local", "share", "classcharts")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activity (
+    student_id INTEGER, id INTEGER, timestamp TEXT, data TEXT,
+    PRIMARY KEY (student_id, id)
+);
+CREATE TABLE IF NOT EXISTS homework (
+    student_id INTEGER, id INTEGER, issue_date TEXT, due_date TEXT, data TEXT,
+    PRIMARY KEY (student_id, id)
+);
+CREATE TABLE IF NOT EXISTS detentions (
+    student_id INTEGER, id INTEGER, date TEXT, data TEXT,
+    PRIMARY KEY (student_id, id)
+);
+CREATE TABLE IF NOT EXISTS attendance (
+    student_id INTEGER, date TEXT, session TEXT, code TEXT, status TEXT,
+    late_minutes INTEGER,
+    PRIMARY KEY (student_id, date, session)
+);
+CREATE TABLE IF NOT EXISTS announcements (
+    student_id INTEGER, id INTEGER, timestamp TEXT, data TEXT,
+    PRIMARY KEY (student_id, id)
+);
+CREATE TABLE IF NOT EXISTS timetable (
+    student_id INTEGER, date TEXT, period_number TEXT, data TEXT,
+    PRIMARY KEY (student_id, date, period_number)
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    student_id INTEGER, endpoint TEXT, id INTEGER, date TEXT, hash TEXT, data TEXT,
+    PRIMARY KEY (student_id, endpoint, id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    student_id INTEGER, endpoint TEXT, last_date TEXT, last_id INTEGER,
+    PRIMARY KEY (student_id, endpoint)
+);
+"""
+
+# how each table is listed, newest first where it has a date
+ORDER_BY = {
+    "activity": "timestamp DESC, id DESC",
+    "announcements": "timestamp DESC, id DESC",
+    "attendance": "date DESC, session",
+    "detentions": "date DESC, id DESC",
+    "homework": "issue_date DESC, id DESC",
+    "timetable": "date, CAST(period_number AS INTEGER)",
+}
+
+
+class SyncStore:
+    """SQLite store of synced activity, homework, detentions, attendance,
+    announcements and timetable rows.
+    Rows are keyed by their ClassCharts ids and sync_state keeps the high-water
+    mark (last synced date and last_id) per pupil and endpoint."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DATA_DIR, "sync.sqlite3")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def high_water(self, student_id, endpoint):
+        """Return (last_date, last_id) for a pupil's endpoint, or (None, None)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT last_date, last_id FROM sync_state"
+                " WHERE student_id = ? AND endpoint = ?",
+                (student_id, endpoint),
+            ).fetchone()
+        return row or (None, None)
+
+    def save(self, table, rows, student_id, endpoint, last_date, last_id=None):
+        """Upsert rows and move the high-water mark in one transaction."""
+        with self._lock, self._db:
+            if rows:
+                placeholders = ", ".join("?" * len(rows[0]))
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", rows
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+                (student_id, endpoint, last_date, last_id),
+            )
+
+    def rows(self, table, student_id):
+        """Return the stored JSON payloads of a table for one pupil."""
+        with self._lock:
+            cursor = self._db.execute(
+                f"SELECT data FROM {table} WHERE student_id = ? ORDER BY id DESC",
+                (student_id,),
+            )
+            return [json.loads(data) for (data,) in cursor]
+
+    def page(self, table, student_id, limit=None, offset=0):
+        """Return (total rows, one page of rows) of a table for one pupil.
+        Rows are the stored JSON payloads, or column dicts for attendance."""
+        with self._lock:
+            (total,) = self._db.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE student_id = ?", (student_id,)
+            ).fetchone()
+            cursor = self._db.execute(
+                f"SELECT * FROM {table} WHERE student_id = ?"
+                f" ORDER BY {ORDER_BY[table]} LIMIT ? OFFSET ?",
+                (student_id, -1 if limit is None else limit, offset),
+            )
+            names = [column[0] for column in cursor.description]
+            rows = []
+            for values in cursor:
+                row = dict(zip(names, values))
+                rows.append(json.loads(row["data"]) if "data" in row else row)
+        return total, rows
+
+    def snapshot(self, student_id, endpoint):
+        """Return {id: (date, hash)} of the last change-detection snapshot."""
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT id, date, hash FROM snapshots"
+                " WHERE student_id = ? AND endpoint = ?",
+                (student_id, endpoint),
+            )
+            return {record_id: (day, digest) for record_id, day, digest in cursor}
+
+    def apply_changes(self, changes):
+        """Move the change-detection snapshot past a list of Change objects."""
+        with self._lock, self._db:
+            for change in changes:
+                if change.kind == "delete":
+                    self._db.execute(
+                        "DELETE FROM snapshots"
+                        " WHERE student_id = ? AND endpoint = ? AND id = ?",
+                        (change.student_id, change.endpoint, change.id),
+                    )
+                else:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            change.student_id,
+                            change.endpoint,
+                            change.id,
+                            change.date,
+                            change.digest,
+                            json.dumps(change.record),
+                        ),
+                    )
+
+    def close(self):
+        """Close the store database."""
+        self._db.close()
+
+
+def _window_start(last_date, days, overlap):
+    """First date to fetch: the last sync minus overlap, or the initial window."""
+    today = date.today()
+    if last_date is None:
+        return today - timedelta(days=days)
+    return date.fromisoformat(last_date) - timedelta(days=overlap)
+
+
+def sync_activity(session, store, student_id, days=30, overlap=1):
+    """Fetch activity newer than the stored last_id; return rows added."""
+    today = date.today()
+    last_date, last_id = store.high_water(student_id, "activity")
+    from_date = _window_start(last_date, days, overlap)
+    rows = []
+    newest_id = last_id or 0
+    # activity pages come newest first, so stop at the first already-stored id
+    for activity in client.iter_activity(session, student_id, from_date, today):
+        if last_id is not None and activity.id <= last_id:
+            break
+        newest_id = max(newest_id, activity.id)
+        rows.append(
+            (
+                student_id,
+                activity.id,
+                activity.timestamp,
+                json.dumps(activity.to_dict()),
+            )
+        )
+    store.save("activity", rows, student_id, "activity", str(today), newest_id)
+    return len(rows)
+
+
+def sync_homework(session, store, student_id, days=30, overlap=1):
+    """Fetch homework issued since the last sync; return rows fetched."""
+    today = date.today()
+    last_date, _ = store.high_water(student_id, "homework")
+    from_date = _window_start(last_date, days, overlap)
+    rows = []
+    for homework in client.get_homework(session, student_id, from_date, today):
+        rows.append(
+            (
+                student_id,
+                homework.id,
+                homework.issue_date,
+                homework.due_date,
+                json.dumps(homework.to_dict()),
+            )
+        )
+    store.save("homework", rows, student_id, "homework", str(today))
+    return len(rows)
+
+
+def sync_detentions(session, store, student_id):
+    """Fetch detentions (the endpoint has no date filter); return rows fetched."""
+    rows = []
+    for detention in client.get_detentions(session, student_id):
+        rows.append(
+            (student_id, detention.id, detention.date, json.dumps(detention.to_dict()))
+        )
+    store.save("detentions", rows, student_id, "detentions", str(date.today()))
+    return len(rows)
+
+
+def sync_attendance(session, store, student_id, days=30, overlap=1):
+    """Fetch attendance sessions since the last sync; return rows fetched."""
+    today = date.today()
+    last_date, _ = store.high_water(student_id, "attendance")
+    from_date = _window_start(last_date, days, overlap)
+    rows = []
+    for attendance_date, attendance_session, attendance in client.get_attendance(
+        session, student_id, from_date, today
+    ).sessions():
+        rows.append(
+            (
+                student_id,
+                attendance_date,
+                attendance_session,
+                attendance.code,
+                attendance.status,
+                attendance.late_minutes,
+            )
+        )
+    store.save("attendance", rows, student_id, "attendance", str(today))
+    return len(rows)
+
+
+def sync_announcements(session, store, student_id):
+    """Fetch announcements (the endpoint has no date filter); return rows fetched."""
+    rows = []
+    for announcement in client.get_announcements(session, student_id):
+        rows.append(
+            (
+                student_id,
+                announcement.id,
+                announcement.timestamp,
+                json.dumps(announcement.to_dict()),
+            )
+        )
+    store.save("announcements", rows, student_id, "announcements", str(date.today()))
+    return len(rows)
+
+
+def sync_timetable(session, store, student_id):
+    """Fetch every timetable day around today; return lessons fetched."""
+    today = date.today()
+    rows = []
+    for day, lessons in client.iter_timetable_days(session, student_id, today):
+        for lesson in lessons:
+            rows.append(
+                (
+                    student_id,
+                    lesson.date or day,
+                    lesson.period_number,
+                    json.dumps(lesson.to_dict()),
+                )
+            )
+    store.save("timetable", rows, student_id, "timetable", str(today))
+    return len(rows)
+
+
+def sync_endpoint(session, store, student_id, endpoint, days=30, overlap=1):
+    """Sync one endpoint (a store table name) for one pupil; return rows fetched."""
+    if endpoint == "activity":
+        return sync_activity(session, store, student_id, days, overlap)
+    if endpoint == "attendance":
+        return sync_attendance(session, store, student_id, days, overlap)
+    if endpoint == "homework":
+        return sync_homework(session, store, student_id, days, overlap)
+    if endpoint == "announcements":
+        return sync_announcements(session, store, student_id)
+    if endpoint == "detentions":
+        return sync_detentions(session, store, student_id)
+    if endpoint == "timetable":
+        return sync_timetable(session, store, student_id)
+    raise ValueError(f"unknown sync endpoint: {endpoint}")
+
+
+def sync_pupil(session, store, student_id, days=30, overlap=1):
+    """Sync every endpoint for one pupil; return {endpoint: rows fetched}."""
+    return {
+        "activity": sync_activity(session, store, student_id, days, overlap),
+        "homework": sync_homework(session, store, student_id, days, overlap),
+        "detentions": sync_detentions(session, store, student_id),
+        "attendance": sync_attendance(session, store, student_id, days, overlap),
+    }
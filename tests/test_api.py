@@ -0,0 +1,85 @@
+"""QueryAPI error handling."""
+
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from api import QueryAPI
+from classcharts import AuthenticationError, RequestPolicy, Session
+
+
+class FailingSession:
+    """Session whose every request is rejected."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, path):
+        self.calls += 1
+        raise AuthenticationError(f"401 Unauthorized: {path}")
+
+
+@pytest.fixture(name="failing_api")
+def fixture_failing_api():
+    session = FailingSession()
+    api = QueryAPI(session, store=None, port=0)
+    threading.Thread(target=api.serve_forever, daemon=True).start()
+    yield api, session
+    api.stop()
+
+
+@pytest.mark.parametrize("path", ["/pupils", "/pupils/1/homework"])
+def test_pupils_failure_is_a_json_502(failing_api, path):
+    api, _ = failing_api
+    with pytest.raises(urllib.error.HTTPError) as err:
+        urllib.request.urlopen(api.url + path, timeout=5)
+    assert err.value.code == 502
+    assert "401 Unauthorized" in json.loads(err.value.read())["error"]
+
+
+def test_concurrent_cold_requests_fetch_pupils_once():
+    started = threading.Event()
+    release = threading.Event()
+
+    class SlowSession:
+        calls = 0
+
+        def get(self, path):
+            SlowSession.calls += 1
+            started.set()
+            release.wait(5)
+            return {"success": 1, "data": [{"id": 1}], "meta": {}}
+
+    api = QueryAPI(SlowSession(), store=None, port=0)
+    threading.Thread(target=api.serve_forever, daemon=True).start()
+    threads = [threading.Thread(target=api.pupils) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join()
+    api.stop()
+    assert SlowSession.calls == 1
+
+
+def test_unreachable_upstream_is_a_json_502(monkeypatch):
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    monkeypatch.setenv("api_url", f"http://127.0.0.1:{port}")
+    session = Session(policy=RequestPolicy(retries=0))
+    api = QueryAPI(session, store=None, port=0)
+    threading.Thread(target=api.serve_forever, daemon=True).start()
+    try:
+        with pytest.raises(urllib.error.HTTPError) as err:
+            urllib.request.urlopen(api.url + "/pupils/1/homework", timeout=5)
+    finally:
+        api.stop()
+        session.close()
+    assert err.value.code == 502
+    assert "unreachable" in json.loads(err.value.read())["error"]
@@ -0,0 +1,151 @@
+"""Resumed attachment downloads."""
+
+import os
+
+import pytest
+
+from attachments import Attachment, AttachmentStore, Downloader
+from classcharts import Session
+from mockserver import MockServer
+
+
+@pytest.fixture(name="mock")
+def fixture_mock():
+    mock = MockServer(pupils=1)
+    mock.attachment_size = 1000
+    mock.start()
+    yield mock
+    mock.stop()
+
+
+@pytest.fixture(name="store")
+def fixture_store(tmp_path):
+    store = AttachmentStore(str(tmp_path))
+    yield store
+    store.close()
+
+
+def _download(store, url):
+    session = Session()
+    try:
+        attachment = Attachment(
+            student_id=1, source="homework", source_id=5, filename="a.pdf", url=url
+        )
+        summary = Downloader(session, store).download([attachment])
+    finally:
+        session.close()
+    return summary, os.path.join(store.root, "1", attachment.name)
+
+
+def _partial(store, url, content, validator=None):
+    with open(store.partial_path(url), "wb") as output:
+        output.write(content)
+    if validator is not None:
+        with open(store.validator_path(url), "w", encoding="utf-8") as output:
+            output.write(validator)
+
+
+def test_resume_with_changed_validator_fetches_whole_file(mock, store):
+    url = mock.file_url("worksheet.pdf")
+    _partial(store, url, b"x" * 400, validator='"stale"')
+    summary, path = _download(store, url)
+    assert summary["failed"] == []
+    with open(path, "rb") as source:
+        assert source.read() == mock.file_body("worksheet.pdf")
+    assert not os.path.exists(store.validator_path(url))
+
+
+def test_resume_with_matching_validator_appends(mock, store):
+    url = mock.file_url("worksheet.pdf")
+    body = mock.file_body("worksheet.pdf")
+    session = Session()
+    try:
+        etag = session.transport.http.get(url).headers["ETag"]
+    finally:
+        session.close()
+    _partial(store, url, body[:400], validator=etag)
+    summary, path = _download(store, url)
+    assert summary["bytes"] == len(body) - 400
+    with open(path, "rb") as source:
+        assert source.read() == body
+
+
+@pytest.mark.parametrize("extra", [0, 500])
+def test_416_completes_only_a_partial_of_the_right_size(mock, store, extra):
+    url = mock.file_url("worksheet.pdf")
+    body = mock.file_body("worksheet.pdf")
+    _partial(store, url, body + b"x" * extra)
+    summary, path = _download(store, url)
+    assert summary["failed"] == []
+    with open(path, "rb") as source:
+        assert source.read() == body
+
+
+def test_request_errors_are_reported_not_raised(store):
+    summary, _ = _download(store, "http://")
+    assert [url for url, _ in summary["failed"]] == ["http://"]
+
+
+class FakeResponse:
+    """Streamed response with a fixed status, headers and body."""
+
+    def __init__(self, status_code, body, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start : start + chunk_size]
+
+
+def test_206_for_another_range_restarts_the_download(store, monkeypatch):
+    body = bytes(range(256)) * 4
+    url = "http://files.example/worksheet.pdf"
+    _partial(store, url, body[:400])
+    responses = [
+        # asked for bytes=400-, sent from the start of the file
+        FakeResponse(206, body, {"Content-Range": f"bytes 0-1023/{len(body)}"}),
+        FakeResponse(200, body),
+    ]
+    sent = []
+    session = Session()
+
+    def get(url, headers=None, **kwargs):
+        sent.append(headers)
+        return responses.pop(0)
+
+    monkeypatch.setattr(session.transport.http, "get", get)
+    try:
+        attachment = Attachment(
+            student_id=1, source="homework", source_id=5, filename="a.pdf", url=url
+        )
+        summary = Downloader(session, store).download([attachment])
+    finally:
+        session.close()
+    assert summary["failed"] == []
+    assert sent == [{"Range": "bytes=400-"}, {}]
+    with open(os.path.join(store.root, "1", attachment.name), "rb") as source:
+        assert source.read() == body
+
+
+@pytest.mark.parametrize("method", ["commit", "link"])
+def test_store_errors_are_reported_not_raised(mock, store, monkeypatch, method):
+    def fail(*args):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(store, method, fail)
+    url = mock.file_url("worksheet.pdf")
+    summary, _ = _download(store, url)
+    assert [(failed, str(err)) for failed, err in summary["failed"]] == [
+        (url, "[Errno 28] No space left on device")
+    ]
@@ -0,0 +1,66 @@
+"""Attendance statistics."""
+
+import main
+from attendance import AttendanceColumns
+
+META = {
+    "dates": [],
+    "sessions": ["AM", "PM"],
+    "percentage": "0",
+    "percentage_singe_august": "95.2",
+    "start_date": "2024-08-01T00:00:00+00:00",
+    "end_date": "2024-08-07T00:00:00+00:00",
+}
+
+
+class EmptyRangeSession:
+    """Session answering /attendance for a range with no school days."""
+
+    def get(self, path):
+        return {"success": 1, "data": [], "meta": META}
+
+
+def test_empty_range(capsys):
+    main._get_attendance(EmptyRangeSession(), 1, days=7)
+    output = capsys.readouterr().out
+    assert "Attendance data for range: 2024-08-01-2024-08-07" in output
+    assert "Total sessions: 0 over 0 days" in output
+
+
+def test_summary():
+    columns = AttendanceColumns.from_api(
+        {
+            "2024-09-02": {
+                "AM": {"status": "present"},
+                "PM": {"status": "late", "late_minutes": 5},
+            },
+            "2024-09-03": {"AM": {"status": "absent"}, "PM": {"status": "ignore"}},
+            "2024-09-09": {"AM": {"status": "yes"}, "PM": {"status": "no"}},
+        }
+    )
+    summary = columns.summary(window=2)
+    assert summary.status_counts == {
+        "yes": 1,
+        "present": 1,
+        "ignore": 1,
+        "no": 1,
+        "absent": 1,
+        "excused": 0,
+        "late": 1,
+    }
+    assert summary.session_counts["AM"]["absent"] == 1
+    assert summary.session_counts["PM"]["late"] == 1
+    assert summary.day_counts["2024-09-03"]["ignore"] == 1
+    assert summary.late_minutes == 5
+    assert summary.percentage == 60.0
+    assert summary.rolling_percentage == {
+        "2024-09-02": 100.0,
+        "2024-09-03": 66.7,
+        "2024-09-09": 33.3,
+    }
+    assert summary.weeks[(2024, 36)] == {
+        "attended": 2,
+        "counted": 3,
+        "days": 2,
+        "percentage": 66.7,
+    }
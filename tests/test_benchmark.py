@@ -0,0 +1,38 @@
+"""Per-command benchmarks against the mock server, for pytest-benchmark.
+
+Run with `python -m pytest tests/test_benchmark.py --benchmark-only`; the
+module is skipped when pytest-benchmark is not installed. benchmark.py
+stays the tool for request latency percentiles, peak memory, data sizes
+and startup time, which pytest-benchmark does not measure.
+"""
+
+import contextlib
+import io
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+# pylint: disable=wrong-import-position
+import benchmark as suite  # noqa: E402
+from classcharts import Session  # noqa: E402
+
+
+@pytest.fixture(scope="module", name="session")
+def fixture_session():
+    suite.MOCK.configure(latency=0, error_rate=0.0, **suite.SIZES["small"])
+    suite.MOCK.start()
+    session = Session(pool_size=16)
+    session.login()
+    yield session
+    session.close()
+    suite.MOCK.stop()
+
+
+@pytest.mark.parametrize("command", list(suite.COMMANDS))
+def test_command(benchmark, session, command):
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            suite.COMMANDS[command](session)
+
+    benchmark(run)
@@ -0,0 +1,70 @@
+"""changes against a mock ClassCharts API whose data changes between runs."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from mockserver import MockServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _announcements(*ids):
+    return {
+        "success": 1,
+        "data": [
+            {
+                "id": announcement_id,
+                "title": f"Announcement {announcement_id}",
+                "description": "<p>body</p>",
+                "teacher_name": "Head Teacher",
+                "timestamp": "2026-01-01",
+                "attachments": [],
+            }
+            for announcement_id in ids
+        ],
+        "meta": {},
+        "error": "",
+    }
+
+
+@pytest.fixture(name="mock")
+def fixture_mock():
+    mock = MockServer(pupils=1).start()
+    yield mock
+    mock.stop()
+
+
+def _run_changes(mock, tmp_path):
+    env = {
+        **os.environ,
+        "api_url": mock.url,
+        "email": "x",
+        "password": "x",
+        "token_file": str(tmp_path / "session.json"),
+        "cache_dir": str(tmp_path / "cache"),
+        "data_dir": str(tmp_path / "data"),
+    }
+    result = subprocess.run(
+        [sys.executable, "main.py", "changes", "--endpoints", "announcements"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+        check=True,
+    )
+    return result.stdout
+
+
+def test_changes_sees_upstream_changes_between_runs(mock, tmp_path):
+    mock.fixtures["announcements"] = _announcements(1, 2, 3)
+    first = _run_changes(mock, tmp_path)
+    assert "announcements: 3 new, 0 changed, 0 removed" in first
+
+    mock.fixtures["announcements"] = _announcements(99)
+    second = _run_changes(mock, tmp_path)
+    assert "insert announcements 99" in second
+    assert "announcements: 1 new, 0 changed, 3 removed" in second
@@ -0,0 +1,92 @@
+"""Client functions and their request fan-out."""
+
+import asyncio
+from datetime import date
+
+import pytest
+
+import client
+import store
+from classcharts import APIError, AsyncSession, Session
+from mockserver import MockServer
+
+
+class FailingPages(Session):
+    """Session whose second activity page is an API error."""
+
+    def __init__(self):  # pylint: disable=super-init-not-called
+        self.pages = [
+            {"success": 1, "data": [{"id": 2}, {"id": 1}], "meta": {}},
+            {"success": 0, "error": "Too many requests"},
+        ]
+
+    def get(self, path):
+        return self.pages.pop(0)
+
+
+def test_iter_activity_raises_on_failed_page():
+    activity = client.iter_activity(FailingPages(), 1, "2024-01-01", "2024-01-31")
+    assert [entry.id for entry in [next(activity), next(activity)]] == [2, 1]
+    with pytest.raises(APIError, match="Too many requests"):
+        next(activity)
+
+
+def test_sync_does_not_store_failed_response(tmp_path):
+    session = FailingPages()
+    session.pages.pop(0)
+    sync_store = store.SyncStore(str(tmp_path / "sync.sqlite3"))
+    try:
+        with pytest.raises(APIError):
+            store.sync_detentions(session, sync_store, 1)
+        assert sync_store.high_water(1, "detentions") == (None, None)
+    finally:
+        sync_store.close()
+
+
+@pytest.fixture(name="mock_session")
+def fixture_mock_session(monkeypatch):
+    mock = MockServer(pupils=1).start()
+    monkeypatch.setenv("api_url", mock.url)
+    session = Session()
+    session.login()
+    mock.reset_counts()
+    yield mock, session
+    session.close()
+    mock.stop()
+
+
+def test_timetable_range_fetches_each_day_once(mock_session):
+    mock, session = mock_session
+    lessons = client.get_timetable_range(session, 1, date.today(), concurrency=4)
+    assert mock.requests["timetable"] == mock.timetable_days
+    assert len(lessons) == 5 * mock.timetable_days
+    assert [lesson.start_time for lesson in lessons[:2]] == ["09:00", "10:00"]
+
+
+def test_sync_timetable_fetches_each_day_once(mock_session, tmp_path):
+    mock, session = mock_session
+    sync_store = store.SyncStore(str(tmp_path / "sync.sqlite3"))
+    try:
+        rows = store.sync_timetable(session, sync_store, 1)
+    finally:
+        sync_store.close()
+    assert rows == 5 * mock.timetable_days
+    assert mock.requests["timetable"] == mock.timetable_days
+
+
+def test_async_timetable_fetches_each_day_once(monkeypatch):
+    mock = MockServer(pupils=1).start()
+    monkeypatch.setenv("api_url", mock.url)
+
+    async def fetch():
+        async with AsyncSession() as session:
+            await session.login()
+            mock.reset_counts()
+            return await session.get_timetable(1, date.today())
+
+    try:
+        lessons = asyncio.run(fetch())
+    finally:
+        mock.stop()
+    assert len(lessons) == 5 * mock.timetable_days
+    assert mock.requests["timetable"] == mock.timetable_days
@@ -0,0 +1,29 @@
+"""Streaming exporters."""
+
+import pytest
+
+from exporters import CsvExporter, ParquetExporter
+
+
+def test_csv_export(tmp_path):
+    path = tmp_path / "rows.csv"
+    with CsvExporter(str(path)) as exporter:
+        exporter.write_all([{"id": 1, "tags": ["a"]}, {"id": 2, "tags": []}])
+    assert path.read_text().splitlines() == ["id,tags", '1,"[""a""]"', "2,[]"]
+
+
+def test_empty_csv_export_writes_header(tmp_path):
+    path = tmp_path / "rows.csv"
+    with CsvExporter(str(path), fields=["id", "title"]) as exporter:
+        exporter.write_all([])
+    assert path.read_text().splitlines() == ["id,title"]
+
+
+def test_empty_parquet_export_writes_schema(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "rows.parquet"
+    with ParquetExporter(str(path), fields=["id", "title"]) as exporter:
+        exporter.write_all([])
+    table = parquet.read_table(str(path))
+    assert table.num_rows == 0
+    assert table.schema.names == ["id", "title"]
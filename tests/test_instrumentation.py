@@ -0,0 +1,50 @@
+"""Request instrumentation."""
+
+import pytest
+
+from cache import ResponseCache
+from classcharts import Session
+from instrumentation import endpoint
+from mockserver import MockServer
+
+
+@pytest.mark.parametrize(
+    "url, name",
+    [
+        ("https://www.classcharts.com/apiv2parent/pupils", "pupils"),
+        ("https://www.classcharts.com/apiv2parent/homeworks/12/?from=x", "homeworks"),
+        ("http://127.0.0.1:8000/timetable/12", "timetable"),
+        ("http://127.0.0.1:8000/", ""),
+    ],
+)
+def test_endpoint(url, name):
+    assert endpoint(url) == name
+
+
+def test_cache_label_only_on_cached_endpoints(tmp_path, monkeypatch):
+    mock = MockServer(pupils=1).start()
+    monkeypatch.setenv("api_url", mock.url)
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"))
+    session = Session(cache=cache)
+    try:
+        session.login()
+        for _ in range(2):
+            session.get("pupils")
+            session.get("detentions/1")
+    finally:
+        session.close()
+        mock.stop()
+    labels = {
+        (name, cache): count
+        for (name, _, _, cache), (
+            count,
+            _,
+            _,
+        ) in session.instrumentation.requests.items()
+    }
+    assert labels == {
+        ("login", "none"): 1,
+        ("pupils", "miss"): 1,
+        ("pupils", "hit"): 1,
+        ("detentions", "bypass"): 2,
+    }
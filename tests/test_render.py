@@ -0,0 +1,19 @@
+"""Text table rendering."""
+
+import io
+
+from render import TableWriter, tabulate
+
+
+def test_rows_of_different_lengths_share_columns():
+    stream = io.StringIO()
+    tabulate([["a", "bb"], ["ccc"]], stream)
+    assert stream.getvalue() == "a    bb  \nccc  \n"
+
+
+def test_row_wider_than_fixed_widths_is_written():
+    stream = io.StringIO()
+    with TableWriter(stream, widths=[3]) as writer:
+        writer.write(["a"])
+        writer.write(["b", "extra", 1])
+    assert stream.getvalue() == "a    \nb    extra  1  \n"
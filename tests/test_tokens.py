@@ -0,0 +1,126 @@
+"""TokenManager background refresh timing."""
+
+import json
+import os
+import threading
+
+import classcharts
+
+
+class FakeClock:
+    """Monotonic clock moved by hand."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class FakeSession:
+    """Session whose ping and login just record when they happened."""
+
+    username = "parent@example.com"
+    session_id = "token"
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.tokens = None
+        self.pings = []
+
+    def ping(self):
+        self.pings.append(self.clock.now)
+        self.tokens.issued()
+
+    def login(self):
+        self.tokens.issued()
+
+
+class FakeStop:
+    """Stop event whose wait() advances the clock instead of sleeping, logging
+    in again at `relogin_at` if that falls inside the wait."""
+
+    def __init__(self, clock, tokens, relogin_at, until):
+        self.clock = clock
+        self.tokens = tokens
+        self.relogin_at = relogin_at
+        self.until = until
+
+    def wait(self, timeout):
+        deadline = self.clock.now + timeout
+        if self.relogin_at is not None and self.relogin_at <= deadline:
+            self.clock.now = self.relogin_at
+            self.relogin_at = None
+            self.tokens.session.login()
+        self.clock.now = deadline
+        return self.clock.now >= self.until
+
+
+def test_ping_before_expiry_after_mid_cycle_relogin(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(classcharts, "time", clock)
+    session = FakeSession(clock)
+    tokens = classcharts.TokenManager(session, lifetime=180, margin=30)
+    session.tokens = tokens
+    tokens.issued()
+    # a 401 re-login at t=100 means the new session_id expires at t=280
+    tokens._stop = FakeStop(clock, tokens, relogin_at=100, until=600)
+
+    tokens._run()
+
+    assert session.pings
+    assert 100 < session.pings[0] < 100 + tokens.lifetime
+    for issued, pinged in zip([100] + session.pings, session.pings):
+        assert pinged - issued < tokens.lifetime
+
+
+def test_refresh_errors_do_not_stop_the_thread(monkeypatch, capsys):
+    clock = FakeClock()
+    monkeypatch.setattr(classcharts, "time", clock)
+    session = FakeSession(clock)
+    tokens = classcharts.TokenManager(session, lifetime=180, margin=30)
+    session.tokens = tokens
+    tokens.issued()
+    failures = [OSError("Network is unreachable")]
+
+    def ping():
+        session.pings.append(clock.now)
+        if failures:
+            raise failures.pop()
+        tokens.issued()
+
+    session.ping = ping
+    tokens._stop = FakeStop(clock, tokens, relogin_at=None, until=400)
+
+    tokens._run()
+
+    assert len(session.pings) >= 2
+    assert "Network is unreachable" in capsys.readouterr().err
+
+
+def test_concurrent_saves_leave_one_whole_file(tmp_path):
+    path = tmp_path / "session.json"
+    session = FakeSession(FakeClock())
+    tokens = classcharts.TokenManager(session, path=str(path))
+
+    errors = []
+
+    def save():
+        for _ in range(50):
+            try:
+                tokens.save()
+            except OSError as err:
+                errors.append(err)
+
+    threads = [threading.Thread(target=save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert json.loads(path.read_text())["session_id"] == "token"
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert os.listdir(tmp_path) == ["session.json"]